@@ -0,0 +1,162 @@
+import asyncio
+import math
+import time
+from typing import Dict, Optional
+
+from starlette.responses import JSONResponse
+from starlette.types import ASGIApp, Receive, Scope, Send
+
+from config import get_config
+from logger_config import setup_logger
+
+logger = setup_logger("admission")
+
+# Endpoint class of each admission-controlled route
+ENDPOINT_CLASSES = {
+    ("POST", "/api/upload"): "upload",
+    ("POST", "/api/send-email"): "send",
+    ("POST", "/api/send-batch"): "send",
+}
+# Starting guess of a request's duration, before any has been measured
+INITIAL_DURATION = 1.0
+MAX_RETRY_AFTER = 60
+
+
+class Rejected(Exception):
+    def __init__(self, status_code: int, detail: str, retry_after: int):
+        super().__init__(detail)
+        self.status_code = status_code
+        self.detail = detail
+        self.retry_after = retry_after
+
+
+class Gate:
+    """Concurrency limit with a bounded wait queue for one endpoint class.
+
+    Up to ``limit`` requests run at once and up to ``queue`` more wait for
+    a slot for at most ``timeout`` seconds. Beyond that requests are
+    rejected straight away: 429 when the queue is full, 503 when a queued
+    request timed out. ``limit`` 0 admits everything. Limits apply per
+    worker process.
+    """
+
+    def __init__(self, name: str, limit: int, queue: int, timeout: float):
+        self.name = name
+        self.limit = limit
+        self.queue = queue
+        self.timeout = timeout
+        self.active = 0
+        self.waiting = 0
+        self.rejected = 0
+        # Moving average of request durations, for Retry-After
+        self.duration = INITIAL_DURATION
+        self._slots = asyncio.Semaphore(limit) if limit else None
+
+    def retry_after(self) -> int:
+        """Seconds until the requests ahead should have drained."""
+        ahead = self.active + self.waiting
+        seconds = self.duration * ahead / max(self.limit, 1)
+        return min(max(math.ceil(seconds), 1), MAX_RETRY_AFTER)
+
+    async def acquire(self) -> None:
+        if self._slots is None:
+            self.active += 1
+            return
+        if self._slots.locked() and self.waiting >= self.queue:
+            self.rejected += 1
+            raise Rejected(
+                429,
+                f"Too many {self.name} requests in progress, retry later",
+                self.retry_after(),
+            )
+        self.waiting += 1
+        try:
+            await asyncio.wait_for(self._slots.acquire(), self.timeout)
+        except asyncio.TimeoutError:
+            self.rejected += 1
+            raise Rejected(
+                503,
+                f"Server too busy to handle {self.name} requests, retry later",
+                self.retry_after(),
+            )
+        finally:
+            self.waiting -= 1
+        self.active += 1
+
+    def release(self, duration: float) -> None:
+        self.active -= 1
+        self.duration = 0.8 * self.duration + 0.2 * duration
+        if self._slots is not None:
+            self._slots.release()
+
+    def status(self) -> Dict:
+        return {
+            "active": self.active,
+            "limit": self.limit or None,
+            "waiting": self.waiting,
+            "queue": self.queue,
+            "rejected": self.rejected,
+            "saturated": bool(self._slots and self._slots.locked()),
+        }
+
+
+def _gates() -> Dict[str, Gate]:
+    config = get_config()
+    timeout = config.ADMISSION_QUEUE_TIMEOUT
+    return {
+        "upload": Gate(
+            "upload",
+            config.UPLOAD_CONCURRENCY,
+            config.UPLOAD_QUEUE_DEPTH,
+            timeout,
+        ),
+        "send": Gate(
+            "send", config.SEND_CONCURRENCY, config.SEND_QUEUE_DEPTH, timeout
+        ),
+    }
+
+
+gates = _gates()
+
+
+def saturation() -> Dict[str, Dict]:
+    """Current load of each endpoint class on this worker."""
+    return {name: gate.status() for name, gate in gates.items()}
+
+
+class AdmissionMiddleware:
+    """Admit upload and send requests only while their class has capacity.
+
+    Runs before the request body is read, so a rejected upload never
+    buffers its files. Rejections carry ``Retry-After``.
+    """
+
+    def __init__(self, app: ASGIApp):
+        self.app = app
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        gate: Optional[Gate] = None
+        if scope["type"] == "http":
+            endpoint_class = ENDPOINT_CLASSES.get((scope["method"], scope["path"]))
+            gate = gates.get(endpoint_class)
+        if gate is None:
+            await self.app(scope, receive, send)
+            return
+
+        try:
+            await gate.acquire()
+        except Rejected as e:
+            logger.warning(f"Rejected {scope['method']} {scope['path']}: {e.detail}")
+            response = JSONResponse(
+                {"detail": e.detail},
+                status_code=e.status_code,
+                headers={"Retry-After": str(e.retry_after)},
+            )
+            await response(scope, receive, send)
+            return
+
+        start = time.perf_counter()
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            gate.release(time.perf_counter() - start)
@@ -31,6 +31,7 @@ target_metadata = Base.metadata  # Set metadata to your Base metadata
 # ... etc.
 
 config_instance = Config()  # Initialize your Config class
+config_instance.ensure_directories()
 config.set_main_option(
     "sqlalchemy.url", config_instance.SQLALCHEMY_DATABASE_URI
 )  # Dynamically set SQLAlchemy URL
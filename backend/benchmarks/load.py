@@ -0,0 +1,287 @@
+"""Load generator measuring upload and send throughput against a local sink.
+
+Starts :mod:`benchmarks.smtp_sink`, uploads M attachments and sends them to
+N recipients through the API, then reports messages/sec, p50/p99 latency,
+peak RSS and the email_history write rate.
+
+By default the app is imported in-process (with a throwaway database and
+SMTP settings pointed at the sink). Pass ``--base-url`` to drive an already
+running server instead; that server must be configured with
+``SMTP_SERVER``/``SMTP_PORT`` pointing at the sink and ``--db-path`` should
+name its database file for the write-rate figure.
+
+Example, from the backend directory::
+
+    python -m benchmarks.load --recipients 200 --attachments 3 \\
+        --attachment-size 256k --concurrency 8 --latency 0.02
+"""
+
+import argparse
+import asyncio
+import contextlib
+import os
+import resource
+import sqlite3
+import sys
+import time
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Callable, Dict, List, Optional
+
+import httpx
+
+from benchmarks.smtp_sink import (
+    SMTPSink,
+    add_sink_arguments,
+    sink_options_from_args,
+)
+
+BACKEND_DIR = Path(__file__).resolve().parent.parent
+
+
+@dataclass
+class PhaseResult:
+    name: str
+    latencies: List[float] = field(default_factory=list)
+    errors: int = 0
+    elapsed: float = 0.0
+    # Messages sent by all requests (batch endpoints send many per request)
+    messages: int = 0
+
+    def percentile(self, pct: float) -> float:
+        if not self.latencies:
+            return 0.0
+        ordered = sorted(self.latencies)
+        index = min(len(ordered) - 1, round(pct / 100 * (len(ordered) - 1)))
+        return ordered[index]
+
+    def report(self) -> str:
+        requests = len(self.latencies)
+        rate = self.messages / self.elapsed if self.elapsed else 0.0
+        return (
+            f"{self.name:<12} requests={requests:<6} errors={self.errors:<4} "
+            f"msg/s={rate:8.1f} p50={self.percentile(50) * 1000:8.1f}ms "
+            f"p99={self.percentile(99) * 1000:8.1f}ms"
+        )
+
+
+def parse_size(value: str) -> int:
+    """Parse sizes such as ``512``, ``64k`` or ``2m`` into bytes."""
+    units = {"k": 1024, "m": 1024 * 1024}
+    suffix = value[-1].lower()
+    if suffix in units:
+        return int(float(value[:-1]) * units[suffix])
+    return int(value)
+
+
+def peak_rss_mb() -> float:
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # ru_maxrss is reported in bytes on macOS and kilobytes elsewhere
+    divisor = 1024 * 1024 if sys.platform == "darwin" else 1024
+    return peak / divisor
+
+
+def count_history_rows(db_path: Optional[Path]) -> Optional[int]:
+    if not db_path or not db_path.exists():
+        return None
+    with sqlite3.connect(db_path) as conn:
+        try:
+            return conn.execute("SELECT COUNT(*) FROM email_history").fetchone()[0]
+        except sqlite3.OperationalError:
+            return None
+
+
+async def run_phase(
+    name: str,
+    total: int,
+    concurrency: int,
+    request: Callable[[int], "asyncio.Future"],
+) -> PhaseResult:
+    """Run ``request(i)`` for i in range(total) with bounded concurrency."""
+    result = PhaseResult(name, messages=total)
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def one(index: int) -> None:
+        async with semaphore:
+            start = time.perf_counter()
+            try:
+                ok = await request(index)
+            except httpx.HTTPError:
+                ok = False
+            result.latencies.append(time.perf_counter() - start)
+            if not ok:
+                result.errors += 1
+
+    start = time.perf_counter()
+    await asyncio.gather(*(one(i) for i in range(total)))
+    result.elapsed = time.perf_counter() - start
+    return result
+
+
+async def upload_attachments(client, args) -> tuple:
+    size = parse_size(args.attachment_size)
+    uploaded = []
+
+    async def upload(index: int) -> bool:
+        files = {"files": (f"bench_{index}.bin", os.urandom(size))}
+        response = await client.post("/api/upload", files=files)
+        if response.status_code != 200:
+            return False
+        uploaded.extend(response.json()["files"])
+        return True
+
+    phase = await run_phase(
+        "upload", args.attachments, args.concurrency, upload
+    )
+    return phase, uploaded
+
+
+async def send_single(client, args, attachments: List[dict]) -> PhaseResult:
+    async def send(index: int) -> bool:
+        response = await client.post("/api/send-email", json={
+            "receiver_email": f"bench{index}@example.com",
+            "recipient_name": f"Bench {index}",
+            "subject": f"Benchmark message {index}",
+            "body": "Benchmark body\n" * 20,
+            "files": attachments,
+        })
+        return response.status_code == 200 and response.json()["success"]
+
+    return await run_phase(
+        "send-email", args.recipients, args.concurrency, send
+    )
+
+
+async def send_batch(client, args, attachments: List[dict]) -> PhaseResult:
+    batch_size = args.batch_size
+
+    async def send(index: int) -> bool:
+        first = index * batch_size
+        response = await client.post("/api/send-batch", json={
+            "subject": "Benchmark message for {{ name }}",
+            "body": "Hello {{ name }},\n" + "Benchmark body\n" * 20,
+            "recipients": [
+                {
+                    "receiver_email": f"bench{i}@example.com",
+                    "recipient_name": f"Bench {i}",
+                    "files": attachments,
+                }
+                for i in range(first, min(first + batch_size, args.recipients))
+            ],
+        })
+        return response.status_code == 200 and not response.json()["failed"]
+
+    batches = -(-args.recipients // batch_size)
+    result = await run_phase("send-batch", batches, args.concurrency, send)
+    # Every recipient once; the last batch may be partial
+    result.messages = args.recipients
+    return result
+
+
+SCENARIOS: Dict[str, Callable] = {
+    "send-email": send_single,
+    "send-batch": send_batch,
+}
+
+
+def configure_in_process(args) -> Path:
+    """Point the app at the sink and a throwaway DB before importing it."""
+    db_name = f"bench-{os.getpid()}.db"
+    os.environ.update({
+        "DATABASE_FILE_NAME": db_name,
+        "SMTP_SERVER": "localhost" if args.tls_cert else args.smtp_host,
+        "SMTP_PORT": str(args.smtp_port),
+        "SMTP_EMAIL": "bench@example.com",
+        "SMTP_PASSWORD": "bench",
+        "SMTP_STARTTLS": "true" if args.tls_cert else "false",
+        "ALLOWED_ORIGIN_URLS": os.getenv("ALLOWED_ORIGIN_URLS", "all"),
+    })
+    if args.tls_cert:
+        # Trust the sink's self-signed certificate
+        os.environ["SSL_CERT_FILE"] = args.tls_cert
+    return BACKEND_DIR / "db" / db_name
+
+
+async def run(args) -> None:
+    sink = SMTPSink(sink_options_from_args(args))
+    sink.start_in_thread()
+
+    lifespan = contextlib.nullcontext()
+    if args.base_url:
+        db_path = Path(args.db_path) if args.db_path else None
+        transport = None
+        base_url = args.base_url
+    else:
+        db_path = configure_in_process(args)
+        from main import app
+
+        # ASGITransport does not send lifespan events, so run startup here
+        lifespan = app.router.lifespan_context(app)
+        transport = httpx.ASGITransport(app=app)
+        base_url = "http://bench"
+
+    try:
+        async with lifespan, httpx.AsyncClient(
+            transport=transport, base_url=base_url, timeout=args.timeout
+        ) as client:
+            upload_phase, attachments = await upload_attachments(client, args)
+            rows_before = count_history_rows(db_path)
+            results = [upload_phase]
+            for name in args.scenario:
+                results.append(
+                    await SCENARIOS[name](client, args, attachments)
+                )
+            rows_after = count_history_rows(db_path)
+
+            await client.request(
+                "DELETE", "/api/files", json=[f["path"] for f in attachments]
+            )
+    finally:
+        sink.stop_thread()
+
+    print()
+    for result in results:
+        print(result.report())
+    send_time = sum(r.elapsed for r in results[1:])
+    if rows_before is not None and rows_after is not None and send_time:
+        written = rows_after - rows_before
+        print(f"db writes    rows={written} rate={written / send_time:.1f}/s")
+    stats = sink.stats
+    print(
+        f"smtp sink    connections={stats.connections} "
+        f"messages={stats.messages} rejected={stats.rejected} "
+        f"bytes={stats.bytes}"
+    )
+    print(f"peak RSS     {peak_rss_mb():.1f} MB")
+
+    if not args.base_url and not args.keep_db:
+        for suffix in ("", "-wal", "-shm"):
+            Path(f"{db_path}{suffix}").unlink(missing_ok=True)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--recipients", type=int, default=50)
+    parser.add_argument("--attachments", type=int, default=2)
+    parser.add_argument("--attachment-size", default="64k",
+                        help="Size of each attachment, e.g. 512, 64k, 2m")
+    parser.add_argument("--concurrency", type=int, default=4)
+    parser.add_argument("--batch-size", type=int, default=50,
+                        help="Recipients per /api/send-batch request")
+    parser.add_argument("--scenario", action="append",
+                        choices=sorted(SCENARIOS),
+                        help="Scenario to run (repeatable, default: all)")
+    parser.add_argument("--base-url",
+                        help="Drive a running server instead of in-process")
+    parser.add_argument("--db-path",
+                        help="Database of the --base-url server")
+    parser.add_argument("--keep-db", action="store_true")
+    parser.add_argument("--timeout", type=float, default=60.0)
+    add_sink_arguments(parser)
+    args = parser.parse_args()
+    args.scenario = args.scenario or sorted(SCENARIOS)
+    asyncio.run(run(args))
+
+
+if __name__ == "__main__":
+    main()
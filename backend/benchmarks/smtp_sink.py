@@ -0,0 +1,322 @@
+"""Local asyncio SMTP sink used by the send benchmarks.
+
+Accepts every message (AUTH is accepted unless the login is listed in
+``reject_logins``) and throws it away,
+while counting messages and bytes. Latency, STARTTLS and error injection are
+configurable so the sender can be exercised against slow or flaky relays.
+
+Run standalone with ``python -m benchmarks.smtp_sink --port 2525``.
+"""
+
+import argparse
+import asyncio
+import base64
+import binascii
+import random
+import ssl
+import threading
+from dataclasses import dataclass, field
+from typing import List, Optional, Sequence, Tuple
+
+from logger_config import setup_logger
+
+logger = setup_logger("smtp_sink")
+
+
+@dataclass
+class SinkOptions:
+    host: str = "127.0.0.1"
+    port: int = 2525
+    # Delay applied before every reply, simulating a distant relay
+    latency: float = 0.0
+    tls_cert: Optional[str] = None
+    tls_key: Optional[str] = None
+    pipelining: bool = True
+    chunking: bool = True
+    # Probability of a 451 (temporary) or 550 (permanent) RCPT reply
+    rcpt_tempfail_rate: float = 0.0
+    rcpt_reject_rate: float = 0.0
+    # Probability of a 451 after the message body was received
+    data_tempfail_rate: float = 0.0
+    # Recipients always refused with 550, e.g. to simulate hard bounces
+    reject_recipients: Sequence[str] = ()
+    # Logins always refused with 535, e.g. to exercise sender failover
+    reject_logins: Sequence[str] = ()
+    # Reply to every BDAT chunk but the last, instead of 250
+    bdat_chunk_reply: Optional[str] = None
+    # Keep accepted messages in SMTPSink.received, for tests
+    keep_messages: bool = False
+
+
+@dataclass
+class SinkStats:
+    connections: int = 0
+    messages: int = 0
+    bytes: int = 0
+    rejected: int = 0
+    lock: threading.Lock = field(default_factory=threading.Lock)
+
+    def add(self, **counts: int) -> None:
+        with self.lock:
+            for name, value in counts.items():
+                setattr(self, name, getattr(self, name) + value)
+
+
+class SMTPSink:
+    """Minimal ESMTP server speaking just enough protocol for smtplib."""
+
+    def __init__(self, options: SinkOptions):
+        self.options = options
+        self.stats = SinkStats()
+        # (recipients, data) of accepted messages when keep_messages is set;
+        # DATA bodies are un-dot-stuffed and exclude the terminator
+        self.received: List[Tuple[List[str], bytes]] = []
+        self._tls_context = None
+        if options.tls_cert:
+            self._tls_context = ssl.create_default_context(
+                ssl.Purpose.CLIENT_AUTH
+            )
+            self._tls_context.load_cert_chain(
+                options.tls_cert, options.tls_key
+            )
+        self._server = None
+        self._loop = None
+        self._thread = None
+
+    async def start(self) -> None:
+        self._server = await asyncio.start_server(
+            self._handle, self.options.host, self.options.port
+        )
+        logger.info(
+            f"SMTP sink listening on {self.options.host}:{self.options.port}"
+        )
+
+    async def stop(self) -> None:
+        if self._server:
+            self._server.close()
+            await self._server.wait_closed()
+
+    def start_in_thread(self) -> None:
+        """Serve from a background thread with its own event loop."""
+        ready = threading.Event()
+
+        def run():
+            self._loop = asyncio.new_event_loop()
+            self._loop.run_until_complete(self.start())
+            ready.set()
+            self._loop.run_forever()
+
+        self._thread = threading.Thread(target=run, daemon=True)
+        self._thread.start()
+        ready.wait()
+
+    def stop_thread(self) -> None:
+        if not self._loop:
+            return
+        future = asyncio.run_coroutine_threadsafe(self.stop(), self._loop)
+        future.result()
+        self._loop.call_soon_threadsafe(self._loop.stop)
+        self._thread.join()
+
+    def _extensions(self, tls_active: bool) -> list:
+        extensions = ["SIZE 104857600", "8BITMIME", "AUTH PLAIN LOGIN"]
+        if self.options.pipelining:
+            extensions.append("PIPELINING")
+        if self.options.chunking:
+            extensions.append("CHUNKING")
+        if self._tls_context and not tls_active:
+            extensions.append("STARTTLS")
+        return extensions
+
+    async def _reply(self, writer, line: str) -> None:
+        if self.options.latency:
+            await asyncio.sleep(self.options.latency)
+        writer.write(line.encode() + b"\r\n")
+        await writer.drain()
+
+    async def _handle(self, reader, writer) -> None:
+        self.stats.add(connections=1)
+        tls_active = False
+        recipients: List[str] = []
+        body = bytearray()
+        # Set when a BDAT chunk was refused; later chunks are discarded
+        bdat_failed = False
+        try:
+            await self._reply(writer, "220 smtp-sink ready")
+            while True:
+                line = await reader.readline()
+                if not line:
+                    break
+                verb, _, arg = line.decode(errors="ignore").strip().partition(" ")
+                verb = verb.upper()
+                if verb in ("EHLO", "HELO"):
+                    extensions = self._extensions(tls_active)
+                    lines = ["250-smtp-sink"]
+                    lines += [f"250-{ext}" for ext in extensions[:-1]]
+                    lines.append(f"250 {extensions[-1]}")
+                    await self._reply(writer, "\r\n".join(lines))
+                elif verb == "STARTTLS" and self._tls_context:
+                    await self._reply(writer, "220 Ready to start TLS")
+                    await writer.start_tls(self._tls_context)
+                    tls_active = True
+                elif verb == "AUTH":
+                    mechanism, _, initial = arg.partition(" ")
+                    if mechanism.upper() == "LOGIN":
+                        if not initial:
+                            await self._reply(writer, "334 VXNlcm5hbWU6")
+                            initial = (await reader.readline()).decode()
+                        user = _b64decode(initial.encode())
+                        await self._reply(writer, "334 UGFzc3dvcmQ6")
+                        await reader.readline()
+                    else:
+                        user = _b64decode(initial.encode()).split("\0")[1:2]
+                        user = user[0] if user else ""
+                    if user in self.options.reject_logins:
+                        await self._reply(
+                            writer, "535 5.7.8 Authentication credentials invalid"
+                        )
+                    else:
+                        await self._reply(writer, "235 Authentication succeeded")
+                elif verb == "MAIL":
+                    recipients, body, bdat_failed = [], bytearray(), False
+                    await self._reply(writer, "250 OK")
+                elif verb == "RCPT":
+                    reply = self._rcpt_reply(arg)
+                    if reply.startswith("250"):
+                        recipients.append(_address(arg))
+                    else:
+                        self.stats.add(rejected=1)
+                    await self._reply(writer, reply)
+                elif verb == "DATA":
+                    if not recipients:
+                        await self._reply(writer, "554 No valid recipients")
+                        continue
+                    await self._reply(writer, "354 End data with <CR><LF>.<CR><LF>")
+                    while True:
+                        chunk = await reader.readline()
+                        if not chunk:
+                            # Client went away mid-message; nothing is queued
+                            return
+                        if chunk == b".\r\n":
+                            break
+                        body += chunk[1:] if chunk.startswith(b".") else chunk
+                    await self._accept_message(writer, recipients, bytes(body))
+                    recipients, body = [], bytearray()
+                elif verb == "BDAT":
+                    size, _, last = arg.partition(" ")
+                    chunk = await reader.readexactly(int(size))
+                    if last.upper() == "LAST":
+                        if bdat_failed:
+                            await self._reply(writer, "503 5.5.1 No transaction")
+                        else:
+                            body += chunk
+                            await self._accept_message(
+                                writer, recipients, bytes(body)
+                            )
+                        recipients, body, bdat_failed = [], bytearray(), False
+                    elif bdat_failed:
+                        await self._reply(writer, "503 5.5.1 No transaction")
+                    elif self.options.bdat_chunk_reply:
+                        bdat_failed = True
+                        self.stats.add(rejected=1)
+                        await self._reply(writer, self.options.bdat_chunk_reply)
+                    else:
+                        body += chunk
+                        await self._reply(writer, "250 OK")
+                elif verb == "RSET":
+                    recipients, body, bdat_failed = [], bytearray(), False
+                    await self._reply(writer, "250 OK")
+                elif verb == "NOOP":
+                    await self._reply(writer, "250 OK")
+                elif verb == "QUIT":
+                    await self._reply(writer, "221 Bye")
+                    break
+                else:
+                    await self._reply(writer, "502 Command not implemented")
+        except (ConnectionError, asyncio.IncompleteReadError, ssl.SSLError):
+            pass
+        finally:
+            writer.close()
+
+    def _rcpt_reply(self, arg: str) -> str:
+        address = _address(arg)
+        options = self.options
+        if address in {r.lower() for r in options.reject_recipients}:
+            return "550 5.1.1 User unknown"
+        roll = random.random()
+        if roll < options.rcpt_reject_rate:
+            return "550 5.1.1 User unknown"
+        if roll < options.rcpt_reject_rate + options.rcpt_tempfail_rate:
+            return "451 4.3.0 Temporary failure"
+        return "250 OK"
+
+    async def _accept_message(
+        self, writer, recipients: List[str], data: bytes
+    ) -> None:
+        if random.random() < self.options.data_tempfail_rate:
+            self.stats.add(rejected=1)
+            await self._reply(writer, "451 4.3.0 Try again later")
+            return
+        self.stats.add(messages=1, bytes=len(data))
+        if self.options.keep_messages:
+            self.received.append((list(recipients), data))
+        await self._reply(writer, "250 OK queued")
+
+
+def _address(arg: str) -> str:
+    """Lower-cased address of a MAIL/RCPT argument such as TO:<a@b> SIZE=1."""
+    return arg.partition(":")[2].strip().split(" ")[0].strip("<>").lower()
+
+
+def _b64decode(data: bytes) -> str:
+    try:
+        return base64.b64decode(data.strip()).decode(errors="ignore")
+    except binascii.Error:
+        return ""
+
+
+def add_sink_arguments(parser: argparse.ArgumentParser) -> None:
+    parser.add_argument("--smtp-host", default="127.0.0.1")
+    parser.add_argument("--smtp-port", type=int, default=2525)
+    parser.add_argument("--latency", type=float, default=0.0,
+                        help="Seconds of delay before each SMTP reply")
+    parser.add_argument("--tls-cert", help="Certificate enabling STARTTLS")
+    parser.add_argument("--tls-key", help="Private key for --tls-cert")
+    parser.add_argument("--no-pipelining", action="store_true")
+    parser.add_argument("--no-chunking", action="store_true")
+    parser.add_argument("--rcpt-tempfail-rate", type=float, default=0.0)
+    parser.add_argument("--rcpt-reject-rate", type=float, default=0.0)
+    parser.add_argument("--data-tempfail-rate", type=float, default=0.0)
+    parser.add_argument("--reject", action="append", default=[],
+                        help="Recipient always refused with 550")
+    parser.add_argument("--reject-login", action="append", default=[],
+                        help="Login always refused with 535")
+
+
+def sink_options_from_args(args: argparse.Namespace) -> SinkOptions:
+    return SinkOptions(
+        host=args.smtp_host,
+        port=args.smtp_port,
+        latency=args.latency,
+        tls_cert=args.tls_cert,
+        tls_key=args.tls_key,
+        pipelining=not args.no_pipelining,
+        chunking=not args.no_chunking,
+        rcpt_tempfail_rate=args.rcpt_tempfail_rate,
+        rcpt_reject_rate=args.rcpt_reject_rate,
+        data_tempfail_rate=args.data_tempfail_rate,
+        reject_recipients=args.reject,
+        reject_logins=args.reject_login,
+    )
+
+
+async def _serve(options: SinkOptions) -> None:
+    sink = SMTPSink(options)
+    await sink.start()
+    await sink._server.serve_forever()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    add_sink_arguments(parser)
+    asyncio.run(_serve(sink_options_from_args(parser.parse_args())))
@@ -0,0 +1,103 @@
+import hashlib
+import os
+import shutil
+import tempfile
+import time
+import urllib.parse
+import zipfile
+from dataclasses import dataclass
+from pathlib import Path
+from typing import List, Optional
+
+import spool
+from config import get_config
+from logger_config import setup_logger
+
+logger = setup_logger("bundles")
+
+DEFAULT_BUNDLE_NAME = "attachments.zip"
+
+
+@dataclass
+class Bundle:
+    path: str
+    # Encoded bytes the separate attachments would have taken on the wire
+    unbundled_size: int
+    bundled_size: int
+
+    @property
+    def bytes_saved(self) -> int:
+        return self.unbundled_size - self.bundled_size
+
+
+def safe_bundle_name(name: Optional[str]) -> str:
+    """Reduce a requested archive name to a plain ``.zip`` file name."""
+    name = os.path.basename(name or "").strip() or DEFAULT_BUNDLE_NAME
+    if name.startswith("."):
+        name = DEFAULT_BUNDLE_NAME
+    return name if name.lower().endswith(".zip") else f"{name}.zip"
+
+
+def bundle_dir() -> Path:
+    return get_config().DATA_DIR / "bundles"
+
+
+def _display_name(file_path: str) -> str:
+    return urllib.parse.unquote(os.path.basename(file_path))
+
+
+def bundle_key(file_paths: List[str]) -> str:
+    """Identify a bundle by the content hash and name of each member."""
+    members = sorted(
+        f"{spool.checksum(path)}:{_display_name(path)}" for path in file_paths
+    )
+    return hashlib.sha256("\n".join(members).encode()).hexdigest()
+
+
+def build_bundle(file_paths: List[str], name: str = DEFAULT_BUNDLE_NAME) -> Bundle:
+    """Return a ZIP of ``file_paths``, building it only if not cached.
+
+    The archive is streamed member by member into a temporary file and
+    renamed into place, and is pre-encoded like an upload, so identical
+    bundles for different recipients cost one build and one encoding.
+    """
+    target_dir = bundle_dir() / bundle_key(file_paths)
+    target = target_dir / name
+    if not spool.spooled(str(target)):
+        target_dir.mkdir(parents=True, exist_ok=True)
+        # Unique per writer: sends run in a thread pool, so two threads may
+        # build the same bundle at once
+        with tempfile.NamedTemporaryFile(
+            dir=target_dir, prefix=f".{name}.", suffix=".tmp", delete=False
+        ) as tmp:
+            try:
+                with zipfile.ZipFile(
+                    tmp, "w", compression=zipfile.ZIP_DEFLATED
+                ) as archive:
+                    for file_path in file_paths:
+                        archive.write(file_path, arcname=_display_name(file_path))
+            except BaseException:
+                os.unlink(tmp.name)
+                raise
+        os.replace(tmp.name, target)
+        spool.spool_file(str(target))
+        logger.info(f"Built bundle {target} from {len(file_paths)} files")
+    os.utime(target_dir)  # Mark as recently used for cleanup_bundles()
+
+    unbundled = sum(
+        spool.encoded_size(os.path.getsize(path)) for path in file_paths
+    )
+    bundled = spool.encoded_size(os.path.getsize(target))
+    return Bundle(str(target), unbundled, bundled)
+
+
+def cleanup_bundles(max_age_days: int) -> None:
+    """Drop cached bundles that have not been used for ``max_age_days``."""
+    root = bundle_dir()
+    if not root.exists():
+        return
+    cutoff = time.time() - max_age_days * 86400
+    for entry in root.iterdir():
+        if entry.is_dir() and entry.stat().st_mtime < cutoff:
+            shutil.rmtree(entry, ignore_errors=True)
+            logger.info(f"Deleted unused bundle: {entry}")
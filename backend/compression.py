@@ -0,0 +1,107 @@
+from starlette.datastructures import Headers, MutableHeaders
+from starlette.middleware.gzip import GZipMiddleware
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+try:
+    import brotli
+except ImportError:  # Brotli is optional; gzip is always available
+    brotli = None
+
+
+def accepted_encodings(scope: Scope) -> set:
+    accept = Headers(scope=scope).get("accept-encoding", "")
+    return {part.split(";")[0].strip().lower() for part in accept.split(",")}
+
+
+class CompressionMiddleware:
+    """Compress responses of at least ``minimum_size`` bytes.
+
+    Brotli is used when the ``brotli`` package is installed and the client
+    accepts it; otherwise Starlette's gzip middleware handles the response.
+    Small responses are sent as-is, since compressing them costs more CPU
+    than it saves on the wire.
+    """
+
+    def __init__(
+        self, app: ASGIApp, minimum_size: int = 1024, brotli_quality: int = 4
+    ):
+        self.app = app
+        self.minimum_size = minimum_size
+        self.brotli_quality = brotli_quality
+        self.gzip = GZipMiddleware(app, minimum_size=minimum_size)
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if (
+            scope["type"] == "http"
+            and brotli is not None
+            and "br" in accepted_encodings(scope)
+        ):
+            responder = BrotliResponder(
+                self.app, self.minimum_size, self.brotli_quality
+            )
+            await responder(scope, receive, send)
+            return
+        await self.gzip(scope, receive, send)
+
+
+class BrotliResponder:
+    """Brotli counterpart of Starlette's GZipResponder."""
+
+    def __init__(self, app: ASGIApp, minimum_size: int, quality: int):
+        self.app = app
+        self.minimum_size = minimum_size
+        self.compressor = brotli.Compressor(quality=quality)
+        self.send: Send = None
+        self.initial_message: Message = {}
+        self.started = False
+        self.content_encoding_set = False
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        self.send = send
+        await self.app(scope, receive, self.send_with_brotli)
+
+    def _compressed_headers(self) -> MutableHeaders:
+        headers = MutableHeaders(raw=self.initial_message["headers"])
+        headers["Content-Encoding"] = "br"
+        headers.add_vary_header("Accept-Encoding")
+        return headers
+
+    async def send_with_brotli(self, message: Message) -> None:
+        message_type = message["type"]
+        if message_type == "http.response.start":
+            # Hold the start message until the body size is known
+            self.initial_message = message
+            headers = Headers(raw=message["headers"])
+            self.content_encoding_set = "content-encoding" in headers
+            return
+        if message_type != "http.response.body" or self.content_encoding_set:
+            if not self.started and self.initial_message:
+                self.started = True
+                await self.send(self.initial_message)
+            await self.send(message)
+            return
+
+        body = message.get("body", b"")
+        more_body = message.get("more_body", False)
+        if self.started:
+            message["body"] = self.compressor.process(body) + (
+                self.compressor.flush() if more_body else self.compressor.finish()
+            )
+            await self.send(message)
+            return
+
+        self.started = True
+        if len(body) < self.minimum_size and not more_body:
+            await self.send(self.initial_message)
+            await self.send(message)
+            return
+
+        headers = self._compressed_headers()
+        if more_body:
+            del headers["Content-Length"]
+            message["body"] = self.compressor.process(body) + self.compressor.flush()
+        else:
+            message["body"] = self.compressor.process(body) + self.compressor.finish()
+            headers["Content-Length"] = str(len(message["body"]))
+        await self.send(self.initial_message)
+        await self.send(message)
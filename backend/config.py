@@ -1,4 +1,5 @@
 import os
+from functools import lru_cache
 from pathlib import Path
 
 from dotenv import load_dotenv
@@ -16,21 +17,23 @@ class Config:
     # Base directory for all file paths
     BASE_DIR = Path(__file__).parent
     DB_DIR = BASE_DIR / "db"
+    DATA_DIR = BASE_DIR / "data"
 
     # Security
     SECRET_KEY = os.getenv("SECRET_KEY", "dev-key-please-change")
 
+    # Debugging: requests slower than this are kept (per worker) for
+    # /api/debug/slow-requests
+    SLOW_REQUEST_MS = int(os.getenv("SLOW_REQUEST_MS", 1000))
+    SLOW_REQUEST_BUFFER = int(os.getenv("SLOW_REQUEST_BUFFER", 200))
+
     # Database
     def _get_database_uri(self):
         db_file_name = os.getenv("DATABASE_FILE_NAME", "email.db")
-        # The database will be in the /app/db directory in the container
+        # The database will be in the /app/db directory in the container.
+        # SQLite creates the file on first connect, so nothing is touched
+        # here; ensure_directories() creates DB_DIR during startup.
         db_path = self.DB_DIR / db_file_name
-        if not db_path.exists():
-            logger.warning(f"Database file {db_path} does not exist. Creating it.")
-            db_path.touch()
-        # Log the database path
-        logger.info(f"Using database at: {db_path}")
-        # Return the SQLite connection string
         return f"sqlite:///{db_path}"
 
     # Email settings
@@ -38,21 +41,66 @@ class Config:
     SMTP_PORT = int(os.getenv("SMTP_PORT", 587))
     SENDER_EMAIL = os.getenv("SMTP_EMAIL")
     SMTP_PASSWORD = os.getenv("SMTP_PASSWORD")
+    # Disable only for local relays such as the benchmark SMTP sink
+    SMTP_STARTTLS = os.getenv("SMTP_STARTTLS", "true").lower() == "true"
+    # Optional JSON list of sender accounts with weights and quotas; see
+    # sender_pool.load_accounts. When unset the SMTP_* account is used alone.
+    SMTP_ACCOUNTS_FILE = os.getenv("SMTP_ACCOUNTS_FILE")
+    # How long send results are kept for replay under their Idempotency-Key
+    IDEMPOTENCY_TTL_HOURS = int(os.getenv("IDEMPOTENCY_TTL_HOURS", 24))
+    # Also mark suppressed recipients' addresses inactive
+    SUPPRESSION_DEACTIVATES_ADDRESS = (
+        os.getenv("SUPPRESSION_DEACTIVATES_ADDRESS", "false").lower() == "true"
+    )
+
+    # DKIM signing (needs the cryptography package). The domain defaults to
+    # the sender address's; accounts in SMTP_ACCOUNTS_FILE can override all
+    # three with dkim_key_file, dkim_selector and dkim_domain.
+    DKIM_PRIVATE_KEY_FILE = os.getenv("DKIM_PRIVATE_KEY_FILE")
+    DKIM_SELECTOR = os.getenv("DKIM_SELECTOR")
+    DKIM_DOMAIN = os.getenv("DKIM_DOMAIN")
 
-    if not SENDER_EMAIL:
-        logger.error("SMTP_EMAIL is not set in environment variables.")
-    if not SMTP_PASSWORD:
-        logger.error("SMTP_PASSWORD is not set in environment variables.")
-    if not SMTP_SERVER:
-        logger.warning("SMTP_SERVER is not set, using default smtp.gmail.com.")
+    # email_history rows older than this many days are moved to compressed
+    # archives under DATA_DIR/history_archive; 0 (the default) keeps
+    # everything in the table
+    HISTORY_RETENTION_DAYS = int(os.getenv("HISTORY_RETENTION_DAYS", 0))
+
+    # Admission control, per worker: requests running at once and requests
+    # allowed to wait for a slot, per endpoint class (0 concurrency means
+    # unlimited). Waiting requests give up after ADMISSION_QUEUE_TIMEOUT s.
+    UPLOAD_CONCURRENCY = int(os.getenv("UPLOAD_CONCURRENCY", 4))
+    UPLOAD_QUEUE_DEPTH = int(os.getenv("UPLOAD_QUEUE_DEPTH", 8))
+    SEND_CONCURRENCY = int(os.getenv("SEND_CONCURRENCY", 8))
+    SEND_QUEUE_DEPTH = int(os.getenv("SEND_QUEUE_DEPTH", 32))
+    ADMISSION_QUEUE_TIMEOUT = float(os.getenv("ADMISSION_QUEUE_TIMEOUT", 10))
 
     # File upload
     UPLOAD_FOLDER = BASE_DIR / "uploads"
     MAX_CONTENT_LENGTH = 16 * 1024 * 1024  # 16MB max file size
 
     def __init__(self):
-        logger.debug("Initializing Config")
-        # Set database URI during initialization
         self.SQLALCHEMY_DATABASE_URI = self._get_database_uri()
-        # Ensure upload directory exists
-        self.UPLOAD_FOLDER.mkdir(exist_ok=True)
+
+    def ensure_directories(self) -> None:
+        """Create the database, upload and data directories."""
+        for directory in (self.DB_DIR, self.UPLOAD_FOLDER, self.DATA_DIR):
+            directory.mkdir(exist_ok=True)
+
+    def log_settings(self) -> None:
+        """Report missing settings; called once at application startup."""
+        logger.info(f"Using database at: {self.SQLALCHEMY_DATABASE_URI}")
+        if self.SMTP_ACCOUNTS_FILE:
+            logger.info(f"Using sender accounts from {self.SMTP_ACCOUNTS_FILE}")
+        else:
+            if not self.SENDER_EMAIL:
+                logger.error("SMTP_EMAIL is not set in environment variables.")
+            if not self.SMTP_PASSWORD:
+                logger.error("SMTP_PASSWORD is not set in environment variables.")
+        if not self.SMTP_SERVER:
+            logger.warning("SMTP_SERVER is not set, using default smtp.gmail.com.")
+
+
+@lru_cache(maxsize=None)
+def get_config() -> Config:
+    """Return the process-wide Config instance."""
+    return Config()
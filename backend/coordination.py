@@ -0,0 +1,92 @@
+import os
+import socket
+from contextlib import contextmanager
+from datetime import datetime, timedelta
+from typing import Iterator, Optional
+
+from sqlalchemy import DateTime, bindparam, text
+
+from db import SessionLocal
+from logger_config import setup_logger
+
+logger = setup_logger("coordination")
+
+# Identifies this process among uvicorn/gunicorn workers and containers
+WORKER_ID = f"{socket.gethostname()}:{os.getpid()}"
+
+# A single statement so that two workers racing for the same lease are
+# serialized by SQLite's write lock: the row is only taken over when it is
+# free, expired, or (when renewing) already ours.
+_ACQUIRE_SQL = """
+    INSERT INTO leases (name, owner, expires_at)
+    VALUES (:name, :owner, :expires_at)
+    ON CONFLICT(name) DO UPDATE SET
+        owner = excluded.owner,
+        expires_at = excluded.expires_at
+    WHERE leases.expires_at < :now {renew}
+"""
+_RENEW_SQL = text(
+    _ACQUIRE_SQL.format(renew="OR leases.owner = excluded.owner")
+).bindparams(
+    bindparam("expires_at", type_=DateTime), bindparam("now", type_=DateTime)
+)
+_TAKE_SQL = text(_ACQUIRE_SQL.format(renew="")).bindparams(
+    bindparam("expires_at", type_=DateTime), bindparam("now", type_=DateTime)
+)
+
+
+def acquire_lease(
+    name: str,
+    ttl: timedelta,
+    owner: Optional[str] = None,
+    renew: bool = True,
+) -> bool:
+    """Try to take (or renew) the named lease for ``ttl``.
+
+    Returns True when this worker holds the lease afterwards. Leases expire
+    on their own, so a crashed worker never blocks the others for longer
+    than ``ttl``. With ``renew=False`` a lease this worker already holds is
+    treated as busy too.
+    """
+    owner = owner or WORKER_ID
+    now = datetime.now()
+    with SessionLocal() as session:
+        result = session.execute(
+            _RENEW_SQL if renew else _TAKE_SQL,
+            {
+                "name": name,
+                "owner": owner,
+                "expires_at": now + ttl,
+                "now": now,
+            },
+        )
+        session.commit()
+    acquired = result.rowcount == 1
+    logger.debug(f"Lease {name} {'acquired' if acquired else 'busy'} ({owner})")
+    return acquired
+
+
+def release_lease(name: str, owner: Optional[str] = None) -> None:
+    """Give up the named lease if this worker still holds it."""
+    with SessionLocal() as session:
+        session.execute(
+            text("DELETE FROM leases WHERE name = :name AND owner = :owner"),
+            {"name": name, "owner": owner or WORKER_ID},
+        )
+        session.commit()
+
+
+@contextmanager
+def lease(name: str, ttl: timedelta, release: bool = True) -> Iterator[bool]:
+    """Context manager around :func:`acquire_lease`.
+
+    Yields whether the lease was obtained; callers skip their work when it
+    was not. With ``release=False`` the lease is kept until it expires,
+    which turns it into a cluster-wide "at most once per ``ttl``" guard.
+    """
+    acquired = acquire_lease(name, ttl, renew=release)
+    try:
+        yield acquired
+    finally:
+        if acquired and release:
+            release_lease(name)
@@ -1,18 +1,104 @@
+import zlib
 from datetime import datetime, timezone
+from typing import Dict, List
 
-from sqlalchemy import Column, DateTime, Integer, String, Text, create_engine
+from sqlalchemy import (
+    Boolean,
+    Column,
+    DateTime,
+    Float,
+    ForeignKey,
+    Index,
+    Integer,
+    String,
+    Text,
+    cast,
+    create_engine,
+    event,
+)
+from sqlalchemy.exc import OperationalError
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import sessionmaker
 
-from config import Config
+from config import get_config
+from logger_config import setup_logger
 
-# Initialize database connection
-config = Config()
-engine = create_engine(config.SQLALCHEMY_DATABASE_URI)
+logger = setup_logger("db")
+
+# Initialize database connection. create_engine does not connect, so
+# importing this module has no side effects on the database file.
+config = get_config()
+engine = create_engine(
+    config.SQLALCHEMY_DATABASE_URI,
+    # Wait for other workers' write locks instead of failing immediately
+    connect_args={"timeout": 30},
+)
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 Base = declarative_base()
 
 
+@event.listens_for(engine, "connect")
+def _set_sqlite_pragmas(dbapi_connection, connection_record):
+    """Let several worker processes share the SQLite file safely."""
+    cursor = dbapi_connection.cursor()
+    # Lets the history retention job return freed pages a batch at a time.
+    # Only applies to a new file, so it must precede the WAL switch, which
+    # writes the header; retention converts existing files.
+    cursor.execute("PRAGMA auto_vacuum=INCREMENTAL")
+    # WAL lets readers proceed while another worker writes
+    cursor.execute("PRAGMA journal_mode=WAL")
+    cursor.execute("PRAGMA synchronous=NORMAL")
+    cursor.execute("PRAGMA busy_timeout=30000")
+    cursor.close()
+
+
+def _schema_version() -> int:
+    """Fingerprint of the declared tables, columns and indexes.
+
+    Stored in SQLite's ``user_version`` so that init_db() can tell in one
+    PRAGMA whether create_all is needed.
+    """
+    description = repr(
+        sorted(
+            (
+                table.name,
+                sorted(column.name for column in table.columns),
+                sorted(index.name for index in table.indexes),
+            )
+            for table in Base.metadata.sorted_tables
+        )
+    )
+    return zlib.crc32(description.encode()) & 0x7FFFFFFF
+
+
+def init_db() -> bool:
+    """Create missing tables and indexes once per schema change.
+
+    Workers starting together all read ``user_version``; only while it is
+    stale does a worker run create_all, which makes the check a single
+    PRAGMA on every later start. Returns True when tables were created.
+    """
+    version = _schema_version()
+    with engine.connect() as connection:
+        current = connection.exec_driver_sql("PRAGMA user_version").scalar()
+    if current == version:
+        return False
+
+    logger.info("Database schema changed, creating missing tables")
+    try:
+        Base.metadata.create_all(bind=engine)
+    except OperationalError:
+        # Another worker created the same table between check and create
+        Base.metadata.create_all(bind=engine)
+    # create_all skips existing tables, including indexes added to them later
+    for table in Base.metadata.sorted_tables:
+        for index in table.indexes:
+            index.create(bind=engine, checkfirst=True)
+    with engine.begin() as connection:
+        connection.exec_driver_sql(f"PRAGMA user_version = {version}")
+    return True
+
+
 # Dependency for FastAPI
 def get_db():
     db = SessionLocal()
@@ -22,6 +108,12 @@ def get_db():
         db.close()
 
 
+def column_dicts(query) -> List[Dict]:
+    """Rows of a column-level query as dicts, skipping ORM hydration."""
+    keys = [column["name"] for column in query.column_descriptions]
+    return [dict(zip(keys, row)) for row in query]
+
+
 # Models
 class TimestampMixin(object):
     created_at = Column(
@@ -46,6 +138,18 @@ class Address(TimestampMixin, Base):
 
     status = Column(String(20), nullable=False, default="active")
 
+    @classmethod
+    def dict_columns(cls):
+        """Columns giving ``to_dict()``'s keys in a column-level query."""
+        return (
+            cast(cls.id, String).label("id"),
+            cls.name,
+            cls.email,
+            cls.status,
+            cls.created_at,
+            cls.updated_at,
+        )
+
     def to_dict(self):
         return {
             "id": str(self.id),
@@ -59,6 +163,8 @@ class Address(TimestampMixin, Base):
 
 class EmailHistory(TimestampMixin, Base):
     __tablename__ = "email_history"
+    # Date filters and the retention job's age cutoff
+    __table_args__ = (Index("ix_email_history_created_at", "created_at"),)
 
     id = Column(Integer, primary_key=True, index=True)
     recipient_name = Column(String(100), nullable=False)
@@ -68,6 +174,21 @@ class EmailHistory(TimestampMixin, Base):
     status = Column(String(20), nullable=False)
     message = Column(Text)
 
+    @classmethod
+    def dict_columns(cls):
+        """Columns giving ``to_dict()``'s keys in a column-level query."""
+        return (
+            cast(cls.id, String).label("id"),
+            cls.recipient_name,
+            cls.recipient_email,
+            cls.subject,
+            cls.files,
+            cls.status,
+            cls.message,
+            cls.created_at,
+            cls.updated_at,
+        )
+
     def to_dict(self):
         return {
             "id": str(self.id),
@@ -80,3 +201,184 @@ class EmailHistory(TimestampMixin, Base):
             "created_at": self.created_at.isoformat() if self.created_at else None,
             "updated_at": self.updated_at.isoformat() if self.updated_at else None,
         }
+
+
+class SendStats(Base):
+    """Send counters per day and status, updated with each history row.
+
+    Kept apart from email_history so summaries never scan it, and so they
+    still cover rows the retention job has archived.
+    """
+
+    __tablename__ = "send_stats"
+
+    day = Column(String(10), primary_key=True)
+    status = Column(String(20), primary_key=True)
+    count = Column(Integer, nullable=False, default=0)
+    bytes_sent = Column(Integer, nullable=False, default=0)
+
+
+class FailureReasonStats(Base):
+    """Failed sends per day and failure reason (see stats.failure_reason)."""
+
+    __tablename__ = "failure_reason_stats"
+
+    day = Column(String(10), primary_key=True)
+    reason = Column(String(30), primary_key=True)
+    count = Column(Integer, nullable=False, default=0)
+
+
+class Lease(Base):
+    """Named, expiring lock shared by all worker processes."""
+
+    __tablename__ = "leases"
+
+    name = Column(String(100), primary_key=True)
+    owner = Column(String(200), nullable=False)
+    expires_at = Column(DateTime, nullable=False)
+
+
+class UploadedFile(Base):
+    """Catalog entry for a file in the upload folder.
+
+    Kept in step with the folder by the upload/delete routes so listings
+    never have to scan or stat the directory.
+    """
+
+    __tablename__ = "uploaded_files"
+
+    id = Column(Integer, primary_key=True, index=True)
+    name = Column(String(255), nullable=False, index=True)
+    path = Column(String(1024), nullable=False, unique=True)
+    size = Column(Integer, nullable=False)
+    created_at = Column(DateTime, nullable=False, index=True)
+
+    @classmethod
+    def dict_columns(cls):
+        """Columns giving ``to_dict()``'s keys in a column-level query."""
+        return (cls.name, cls.path, cls.size, cls.created_at.label("created"))
+
+    def to_dict(self):
+        return {
+            "name": self.name,
+            "path": self.path,
+            "size": self.size,
+            "created": self.created_at.isoformat() if self.created_at else None,
+        }
+
+
+class SenderAccountUsage(Base):
+    """Persisted quota counters and health of one sender account.
+
+    Shared by all workers; windows are stored as their start label
+    ("YYYY-MM-DD HH" / "YYYY-MM-DD") and counters restart when it changes.
+    """
+
+    __tablename__ = "sender_account_usage"
+
+    account = Column(String(100), primary_key=True)
+    hour_window = Column(String(13), nullable=False, default="")
+    hour_count = Column(Integer, nullable=False, default=0)
+    day_window = Column(String(10), nullable=False, default="")
+    day_count = Column(Integer, nullable=False, default=0)
+    disabled_until = Column(DateTime)
+    last_error = Column(Text)
+
+
+class Suppression(TimestampMixin, Base):
+    """Recipient that hard-bounced or kept being refused.
+
+    Rows with ``suppressed`` false only count refusals until they reach
+    the limit in suppression.py.
+    """
+
+    __tablename__ = "suppressions"
+
+    email = Column(String(120), primary_key=True)
+    suppressed = Column(Boolean, nullable=False, default=False, index=True)
+    reason = Column(String(30))
+    smtp_code = Column(Integer)
+    message = Column(Text)
+    refusals = Column(Integer, nullable=False, default=0)
+
+    def to_dict(self):
+        return {
+            "email": self.email,
+            "reason": self.reason,
+            "smtp_code": self.smtp_code,
+            "message": self.message,
+            "refusals": self.refusals,
+            "created_at": self.created_at.isoformat() if self.created_at else None,
+            "updated_at": self.updated_at.isoformat() if self.updated_at else None,
+        }
+
+
+class IdempotencyRecord(Base):
+    """Result of a send request stored under its Idempotency-Key.
+
+    ``response`` stays NULL while the first request is still running.
+    """
+
+    __tablename__ = "idempotency_keys"
+
+    key = Column(String(255), primary_key=True)
+    endpoint = Column(String(100), nullable=False)
+    request_hash = Column(String(64), nullable=False)
+    response = Column(Text)
+    created_at = Column(DateTime, nullable=False)
+    expires_at = Column(DateTime, nullable=False, index=True)
+
+
+class ScheduledCampaign(TimestampMixin, Base):
+    """A batch send released over time by the campaign dispatcher."""
+
+    __tablename__ = "scheduled_campaigns"
+
+    id = Column(Integer, primary_key=True, index=True)
+    subject = Column(String(200), nullable=False)
+    body = Column(Text, nullable=False)
+    bundle_name = Column(String(255))
+    start_at = Column(DateTime, nullable=False)
+    # None sends every due message as soon as possible
+    rate_per_minute = Column(Float)
+    status = Column(String(20), nullable=False, default="scheduled")
+    total = Column(Integer, nullable=False, default=0)
+    sent = Column(Integer, nullable=False, default=0)
+    failed = Column(Integer, nullable=False, default=0)
+
+    def to_dict(self):
+        return {
+            "id": str(self.id),
+            "subject": self.subject,
+            "bundle_name": self.bundle_name,
+            "start_at": self.start_at.isoformat(),
+            "rate_per_minute": self.rate_per_minute,
+            "status": self.status,
+            "total": self.total,
+            "sent": self.sent,
+            "failed": self.failed,
+            "created_at": self.created_at.isoformat() if self.created_at else None,
+            "updated_at": self.updated_at.isoformat() if self.updated_at else None,
+        }
+
+
+class ScheduledMessage(Base):
+    """One recipient of a scheduled campaign and its send slot."""
+
+    __tablename__ = "scheduled_messages"
+    # Due messages are found by a range scan on this index
+    __table_args__ = (
+        Index("ix_scheduled_messages_due", "status", "scheduled_at"),
+    )
+
+    id = Column(Integer, primary_key=True)
+    campaign_id = Column(
+        Integer, ForeignKey("scheduled_campaigns.id"), nullable=False, index=True
+    )
+    receiver_email = Column(String(120), nullable=False)
+    recipient_name = Column(String(100), nullable=False, default="")
+    files = Column(Text, nullable=False)
+    scheduled_at = Column(DateTime, nullable=False)
+    status = Column(String(20), nullable=False, default="pending")
+    claimed_at = Column(DateTime)
+    message = Column(Text)
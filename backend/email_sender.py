@@ -1,115 +1,200 @@
-import os
 import smtplib
 import ssl
-import urllib.parse
-from email import encoders
-from email.mime.base import MIMEBase
-from email.mime.multipart import MIMEMultipart
-from email.mime.text import MIMEText
-from typing import Dict, List
+from functools import lru_cache
+from typing import Dict, List, Optional
 
+from dkim_signing import body_hash, signer_for
 from logger_config import setup_logger
+from mime_stream import Attachment, StreamingMessage, new_boundary, text_part
+from sender_pool import failure_reply
+from smtp_client import PipeliningSMTP
 
 logger = setup_logger("email_sender")
 
 
+@lru_cache(maxsize=None)
+def tls_context() -> ssl.SSLContext:
+    """Default TLS context, built once since loading the CA bundle is slow."""
+    return ssl.create_default_context()
+
+
 class EmailSender:
     def __init__(self, config):
         self.smtp_server = config["smtp_server"]
         self.port = config["port"]
         self.sender_email = config["sender_email"]
         self.password = config["password"]
+        self.starttls = config.get("starttls", True)
+        self.dkim = signer_for(
+            self.sender_email,
+            config.get("dkim_key_file"),
+            config.get("dkim_selector"),
+            config.get("dkim_domain"),
+        )
         logger.debug(
             f"EmailSender initialized with server: {self.smtp_server}, port: {self.port}, sender: {self.sender_email}"
         )
 
     def create_message(
-        self, receiver_email: str, subject: str, body: str
-    ) -> MIMEMultipart:
-        message = MIMEMultipart()
-        message["From"] = self.sender_email
-        message["To"] = receiver_email
-        message["Subject"] = subject
-        message.attach(MIMEText(body, "plain"))
+        self,
+        receiver_email: str,
+        subject: str,
+        body: str,
+        parts: Optional[Dict] = None,
+        shared_body: bool = False,
+    ) -> StreamingMessage:
+        # Messages of one campaign share a boundary so identical bodies
+        # serialize to identical bytes
+        boundary = None
+        if parts is not None:
+            boundary = parts.setdefault("boundary", new_boundary())
+        message = StreamingMessage(
+            self.sender_email, receiver_email, subject, boundary
+        )
+        # Personalized bodies never repeat, so caching them only grows parts
+        text_parts = parts if shared_body else None
+        message.attach_bytes(
+            self._cached(text_parts, ("text", body), text_part, body)
+        )
         return message
 
-    def attach_files(self, message: MIMEMultipart, files: List[str]) -> None:
+    def attach_files(
+        self,
+        message: StreamingMessage,
+        files: List[str],
+        parts: Optional[Dict] = None,
+    ) -> None:
         for file_path in files:
-            with open(file_path, "rb") as attachment:
-                part = MIMEBase("application", "octet-stream")
-                part.set_payload(attachment.read())
-                encoders.encode_base64(part)
-
-                # Get original filename and decode if it's URL encoded
-                filename = os.path.basename(file_path)
-                if "%" in filename:
-                    filename = urllib.parse.unquote(filename)
-
-                # RFC 2231 encoding for filename
-                filename_encoded = filename.encode("utf-8")
-                filename_str = filename_encoded.decode("latin-1")
-
-                part.add_header(
-                    "Content-Disposition",
-                    "attachment",
-                    filename=("utf-8", "", filename),  # This is the key change
-                )
-                message.attach(part)
+            message.attach(
+                self._cached(parts, ("file", file_path), Attachment, file_path)
+            )
+
+    def sign(
+        self,
+        message: StreamingMessage,
+        files: List[str],
+        parts: Optional[Dict] = None,
+        shared_body: bool = False,
+    ) -> None:
+        """DKIM-sign ``message``, reusing the body hash of identical bodies.
+
+        Messages sharing ``parts`` also share the boundary and attachment
+        parts, so with a ``shared_body`` the same files give the same body
+        bytes and only the headers are hashed again.
+        """
+        hashes = parts if shared_body else None
+        bh = self._cached(
+            hashes, ("body_hash", tuple(files)), body_hash, message.body_segments
+        )
+        self.dkim.sign(message, bh)
+
+    @staticmethod
+    def _cached(parts: Optional[Dict], key, build, *args):
+        """Build a MIME part once per ``parts`` cache (e.g. per campaign).
+
+        Parts are never mutated after creation, so several messages can
+        share one instance instead of re-encoding the same attachment.
+        """
+        if parts is None:
+            return build(*args)
+        if key not in parts:
+            parts[key] = build(*args)
+        return parts[key]
+
+    def connect(self) -> PipeliningSMTP:
+        """Open an authenticated SMTP session that can send many messages."""
+        logger.debug("Connecting to SMTP server")
+        server = PipeliningSMTP(self.smtp_server, self.port, timeout=10)
+        try:
+            server.ehlo()
+            if self.starttls:
+                logger.debug("Starting TLS")
+                server.starttls(context=tls_context())
+                server.ehlo()
+            logger.debug("Logging into SMTP server")
+            server.login(self.sender_email, self.password)
+        except Exception:
+            server.close()
+            raise
+        return server
 
     def send_email(
-        self, receiver_email: str, subject: str, body: str, files: List[str]
+        self,
+        receiver_email: str,
+        subject: str,
+        body: str,
+        files: List[str],
+        server: Optional[PipeliningSMTP] = None,
+        parts: Optional[Dict] = None,
+        shared_body: bool = False,
     ) -> Dict:
+        """Send one message, over ``server`` if given or a new connection.
+
+        ``parts`` is an optional cache of MIME parts shared by messages of
+        the same campaign (see ``create_message``/``attach_files``);
+        ``shared_body`` says every message in it has this same body, so the
+        text part is cached too.
+        """
         try:
             logger.debug(f"Creating email message for {receiver_email}")
-            message = self.create_message(receiver_email, subject, body)
+            message = self.create_message(
+                receiver_email, subject, body, parts, shared_body
+            )
             if files:
                 logger.debug(f"Attaching {len(files)} files")
-                self.attach_files(message, files)
+                self.attach_files(message, files, parts)
+            if self.dkim is not None:
+                self.sign(message, files, parts, shared_body)
 
-            logger.debug("Connecting to SMTP server")
-            context = ssl.create_default_context()
-            with smtplib.SMTP(self.smtp_server, self.port, timeout=10) as server:
-                server.ehlo()
-                logger.debug("Starting TLS")
-                server.starttls(context=context)
-                server.ehlo()
-                logger.debug("Logging into SMTP server")
-                server.login(self.sender_email, self.password)
-
-                # === START SMTP CONVERSATION ===
-                logger.debug("Starting SMTP conversation")
-                # MAIL FROM first
-                code, response = server.mail(self.sender_email)
-                if code != 250:
-                    error_msg = f"MAIL FROM command failed ({code}): {response.decode(errors='ignore')}"
-                    logger.error(error_msg)
-                    return {"success": False, "message": error_msg}
-
-                # Then RCPT TO
-                logger.debug(f"Verifying recipient {receiver_email}")
-                code, response = server.rcpt(receiver_email)
-                if code != 250 and code != 251:
-                    error_msg = f"Recipient verification failed ({code}): {response.decode(errors='ignore')}"
-                    logger.error(error_msg)
-                    return {"success": False, "message": error_msg}
-
-                # === ACTUALLY SEND ===
-                logger.debug("Sending email")
-                try:
-                    server.send_message(message)
-                    return {
-                        "success": True,
-                        "message": f"Email sent successfully to {receiver_email}",
-                    }
-                except smtplib.SMTPRecipientsRefused as e:
-                    error_msg = f"Recipient {receiver_email} was refused by the server: {e.recipients}"
-                    logger.error(error_msg)
-                    return {"success": False, "message": error_msg}
-                except smtplib.SMTPException as e:
-                    error_msg = f"SMTP error while sending to {receiver_email}: {str(e)}"
-                    logger.error(error_msg)
-                    return {"success": False, "message": error_msg}
+            if server is not None:
+                return self._deliver(server, message, receiver_email)
+            with self.connect() as server:
+                return self._deliver(server, message, receiver_email)
         except Exception as e:
             error_msg = f"Failed to send email to {receiver_email}: {str(e)}"
             logger.error(error_msg, exc_info=True)
-            return {"success": False, "message": error_msg}
\ No newline at end of file
+            return {"success": False, "message": error_msg}
+
+    def _deliver(
+        self, server: PipeliningSMTP, message: StreamingMessage, receiver_email: str
+    ) -> Dict:
+        # PipeliningSMTP batches MAIL FROM/RCPT TO and streams the body with
+        # BDAT when the server supports it, so the envelope is sent once and
+        # attachments go from their spool files straight to the socket.
+        logger.debug("Sending email")
+        try:
+            server.sendmail(self.sender_email, [receiver_email], message)
+            return {
+                "success": True,
+                "message": f"Email sent successfully to {receiver_email}",
+                "bytes_sent": message.size,
+            }
+        except smtplib.SMTPSenderRefused as e:
+            error_msg = f"MAIL FROM command failed ({e.smtp_code}): {e.smtp_error.decode(errors='ignore')}"
+            logger.error(error_msg)
+            return {
+                "success": False,
+                "message": error_msg,
+                "smtp_code": e.smtp_code,
+                "smtp_reply": failure_reply(e),
+            }
+        except smtplib.SMTPRecipientsRefused as e:
+            code, response = e.recipients.get(receiver_email, (None, b""))
+            error_msg = f"Recipient verification failed ({code}): {response.decode(errors='ignore')}"
+            logger.error(error_msg)
+            return {
+                "success": False,
+                "message": error_msg,
+                "smtp_code": code,
+                "smtp_reply": response.decode(errors="ignore"),
+                "smtp_stage": "rcpt",
+            }
+        except smtplib.SMTPException as e:
+            error_msg = f"SMTP error while sending to {receiver_email}: {str(e)}"
+            logger.error(error_msg)
+            return {
+                "success": False,
+                "message": error_msg,
+                "smtp_code": getattr(e, "smtp_code", None),
+                "smtp_reply": failure_reply(e),
+            }
@@ -0,0 +1,99 @@
+import os
+from datetime import datetime
+from pathlib import Path
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from sqlalchemy.orm import Session
+
+from db import UploadedFile, column_dicts
+from logger_config import setup_logger
+
+logger = setup_logger("file_catalog")
+
+SORT_COLUMNS = {
+    "name": UploadedFile.name,
+    "size": UploadedFile.size,
+    "created": UploadedFile.created_at,
+}
+
+
+def _entry_for(file_path: str) -> UploadedFile:
+    stat = os.stat(file_path)
+    return UploadedFile(
+        name=os.path.basename(file_path),
+        path=file_path,
+        size=stat.st_size,
+        created_at=datetime.fromtimestamp(stat.st_ctime),
+    )
+
+
+def add_files(db: Session, file_paths: Iterable[str]) -> None:
+    """Record freshly written uploads in the catalog."""
+    file_paths = list(file_paths)
+    # A path may be reused after its file was removed outside the app
+    db.query(UploadedFile).filter(UploadedFile.path.in_(file_paths)).delete(
+        synchronize_session=False
+    )
+    db.add_all(_entry_for(file_path) for file_path in file_paths)
+    db.commit()
+
+
+def remove_files(db: Session, file_paths: Optional[List[str]] = None) -> None:
+    """Drop catalog entries for the given paths, or all of them."""
+    query = db.query(UploadedFile)
+    if file_paths is not None:
+        query = query.filter(UploadedFile.path.in_(file_paths))
+    query.delete(synchronize_session=False)
+    db.commit()
+
+
+def list_files(
+    db: Session,
+    offset: int = 0,
+    limit: Optional[int] = None,
+    sort: str = "created",
+    order: str = "desc",
+    prefix: Optional[str] = None,
+) -> Tuple[List[Dict], int]:
+    """Return one page of catalog entries as dicts and the total count."""
+    query = db.query(*UploadedFile.dict_columns())
+    if prefix:
+        # A range instead of LIKE so the name index is used
+        query = query.filter(
+            UploadedFile.name >= prefix,
+            UploadedFile.name < prefix + "\U0010ffff",
+        )
+    total = query.count()
+
+    column = SORT_COLUMNS[sort]
+    query = query.order_by(
+        column.asc() if order == "asc" else column.desc(), UploadedFile.id
+    )
+    if offset:
+        query = query.offset(offset)
+    if limit is not None:
+        query = query.limit(limit)
+    return column_dicts(query), total
+
+
+def sync_catalog(db: Session, upload_folder: Path) -> None:
+    """Reconcile the catalog with the folder after out-of-band changes.
+
+    Runs once at startup; afterwards the routes keep the catalog current.
+    """
+    on_disk = {
+        str(upload_folder / entry.name)
+        for entry in os.scandir(upload_folder)
+        if entry.is_file()
+    }
+    cataloged = {path for (path,) in db.query(UploadedFile.path)}
+
+    stale = cataloged - on_disk
+    if stale:
+        remove_files(db, list(stale))
+    missing = on_disk - cataloged
+    if missing:
+        add_files(db, sorted(missing))
+    logger.info(
+        f"File catalog synced: {len(missing)} added, {len(stale)} removed"
+    )
@@ -0,0 +1,155 @@
+import asyncio
+import hashlib
+import json
+from contextlib import asynccontextmanager, suppress
+from datetime import datetime, timedelta
+from typing import AsyncIterator, Dict, Optional
+
+from fastapi.concurrency import run_in_threadpool
+from pydantic import BaseModel
+from sqlalchemy import DateTime, bindparam, text
+from sqlalchemy.orm import Session
+
+from config import get_config
+from db import IdempotencyRecord, SessionLocal
+from logger_config import setup_logger
+
+logger = setup_logger("idempotency")
+
+# A claimed key whose request stopped making progress (e.g. the worker
+# died) can be reused after this long; a running request keeps extending
+# its claim every HEARTBEAT_INTERVAL, however long it takes.
+PENDING_TIMEOUT = timedelta(minutes=2)
+HEARTBEAT_INTERVAL = timedelta(seconds=30)
+
+# Inserts the key, or takes over an expired one, in one statement so two
+# workers retrying the same key cannot both start sending.
+_CLAIM_SQL = text(
+    """
+    INSERT INTO idempotency_keys
+        (key, endpoint, request_hash, response, created_at, expires_at)
+    VALUES (:key, :endpoint, :request_hash, NULL, :now, :expires_at)
+    ON CONFLICT(key) DO UPDATE SET
+        endpoint = excluded.endpoint,
+        request_hash = excluded.request_hash,
+        response = NULL,
+        created_at = excluded.created_at,
+        expires_at = excluded.expires_at
+    WHERE idempotency_keys.expires_at <= :now
+    """
+).bindparams(
+    bindparam("now", type_=DateTime), bindparam("expires_at", type_=DateTime)
+)
+
+
+class IdempotencyError(Exception):
+    """Base class for requests that cannot run under their key."""
+
+
+class KeyReused(IdempotencyError):
+    """The key was already used for a different request."""
+
+
+class RequestInProgress(IdempotencyError):
+    """The first request with this key has not finished yet."""
+
+
+def request_hash(payload: BaseModel) -> str:
+    return hashlib.sha256(payload.model_dump_json().encode()).hexdigest()
+
+
+def claim(
+    db: Session, key: str, endpoint: str, payload: BaseModel
+) -> Optional[Dict]:
+    """Claim ``key`` for this request, or return the stored result.
+
+    Returns None when the caller should run the request and then call
+    ``complete``; raises KeyReused or RequestInProgress when it must not.
+    """
+    now = datetime.now()
+    digest = request_hash(payload)
+    claimed = db.execute(
+        _CLAIM_SQL,
+        {
+            "key": key,
+            "endpoint": endpoint,
+            "request_hash": digest,
+            "now": now,
+            "expires_at": now + PENDING_TIMEOUT,
+        },
+    ).rowcount
+    db.commit()
+    if claimed:
+        return None
+
+    record = db.get(IdempotencyRecord, key)
+    if record.endpoint != endpoint or record.request_hash != digest:
+        raise KeyReused(
+            f"Idempotency-Key {key} was already used for a different request"
+        )
+    if record.response is None:
+        raise RequestInProgress(
+            f"A request with Idempotency-Key {key} is still in progress"
+        )
+    logger.info(f"Replaying stored {endpoint} result for key {key}")
+    return json.loads(record.response)
+
+
+def complete(db: Session, key: str, response: Dict) -> None:
+    """Store the result of a claimed request for the configured TTL."""
+    ttl = timedelta(hours=get_config().IDEMPOTENCY_TTL_HOURS)
+    record = db.get(IdempotencyRecord, key)
+    record.response = json.dumps(response)
+    record.expires_at = datetime.now() + ttl
+    db.commit()
+
+
+def extend(key: str) -> None:
+    """Push back the expiry of a claim whose request is still running."""
+    with SessionLocal() as db:
+        db.query(IdempotencyRecord).filter(
+            IdempotencyRecord.key == key, IdempotencyRecord.response.is_(None)
+        ).update(
+            {"expires_at": datetime.now() + PENDING_TIMEOUT},
+            synchronize_session=False,
+        )
+        db.commit()
+
+
+@asynccontextmanager
+async def heartbeat(key: str) -> AsyncIterator[None]:
+    """Keep ``key``'s claim alive while the block runs."""
+
+    async def beat():
+        while True:
+            await asyncio.sleep(HEARTBEAT_INTERVAL.total_seconds())
+            try:
+                await run_in_threadpool(extend, key)
+            except Exception as e:
+                logger.error(f"Error extending idempotency key {key}: {str(e)}")
+
+    task = asyncio.create_task(beat())
+    try:
+        yield
+    finally:
+        task.cancel()
+        with suppress(asyncio.CancelledError):
+            await task
+
+
+def release(db: Session, key: str) -> None:
+    """Free a claimed key whose request failed, so a retry runs again."""
+    db.query(IdempotencyRecord).filter(
+        IdempotencyRecord.key == key, IdempotencyRecord.response.is_(None)
+    ).delete(synchronize_session=False)
+    db.commit()
+
+
+def purge_expired(db: Session) -> int:
+    deleted = (
+        db.query(IdempotencyRecord)
+        .filter(IdempotencyRecord.expires_at <= datetime.now())
+        .delete(synchronize_session=False)
+    )
+    db.commit()
+    return deleted
@@ -1,8 +1,24 @@
 import logging
+import os
 import time
 from logging.handlers import RotatingFileHandler
 from pathlib import Path
 
+LOG_DIR = Path(__file__).parent / "logs"
+# DEBUG logs every SMTP step and request detail; opt in via LOG_LEVEL
+LOG_LEVEL = os.getenv("LOG_LEVEL", "INFO").upper()
+# Worker processes would each rotate the one log file on their own, losing
+# or misplacing records, so with several workers logs go to stderr only
+LOG_TO_FILE = int(os.getenv("WEB_CONCURRENCY", "1")) <= 1
+
+
+class _LazyRotatingFileHandler(RotatingFileHandler):
+    """Creates the log directory when the first record is written."""
+
+    def _open(self):
+        LOG_DIR.mkdir(exist_ok=True)
+        return super()._open()
+
 
 def setup_logger(name):
     # Get or create logger
@@ -12,14 +28,10 @@ def setup_logger(name):
     if logger.handlers:
         return logger
 
-    logger.setLevel(logging.DEBUG)
+    logger.setLevel(LOG_LEVEL)
     # Prevent propagation to avoid duplicate logs
     logger.propagate = False
 
-    # Create logs directory if it doesn't exist
-    log_dir = Path("logs")
-    log_dir.mkdir(exist_ok=True)
-
     # Create formatters
     file_formatter = logging.Formatter(
         "%(asctime)s - %(name)s - %(levelname)s - %(message)s [in %(pathname)s:%(lineno)d]"
@@ -28,21 +40,19 @@ def setup_logger(name):
         "%(asctime)s - %(name)s - %(levelname)s - %(message)s"
     )
 
-    # File handler
-    file_handler = RotatingFileHandler(
-        "logs/emailsender.log", maxBytes=10240, backupCount=10
-    )
-    file_handler.setFormatter(file_formatter)
-    file_handler.setLevel(logging.DEBUG)
+    if LOG_TO_FILE:
+        # File handler; delay opens the file on the first record, not at import
+        file_handler = _LazyRotatingFileHandler(
+            LOG_DIR / "emailsender.log", maxBytes=10240, backupCount=10, delay=True
+        )
+        file_handler.setFormatter(file_formatter)
+        file_handler.setLevel(LOG_LEVEL)
+        logger.addHandler(file_handler)
 
     # Console handler
     console_handler = logging.StreamHandler()
     console_handler.setFormatter(console_formatter)
-    console_handler.setLevel(logging.DEBUG)
-
-    # Add handlers to logger
-    logger.addHandler(file_handler)
+    console_handler.setLevel(LOG_LEVEL)
     logger.addHandler(console_handler)
 
     return logger
-
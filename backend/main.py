@@ -1,28 +1,57 @@
 import glob
-import json
 import os
 import uuid
-from datetime import datetime, timedelta
+from contextlib import asynccontextmanager, suppress
+from datetime import date, datetime, timedelta
 from pathlib import Path
-from typing import List, Optional
+from typing import List, Literal, Optional
 from urllib.parse import urlparse
 
 import uvicorn
 from dotenv import load_dotenv
-from fastapi import Cookie, Depends, FastAPI, File, HTTPException, Response, UploadFile, BackgroundTasks
+from fastapi import Cookie, Depends, FastAPI, File, Header, HTTPException, Query, Response, UploadFile, BackgroundTasks
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import JSONResponse
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import JSONResponse, ORJSONResponse
 from sqlalchemy import or_
 from sqlalchemy.orm import Session
 from starlette.middleware.base import BaseHTTPMiddleware
 from starlette.requests import Request
 
-from config import Config
-from db import Address, Base, EmailHistory, engine, get_db
+import admission
+import bundles
+import file_catalog
+import idempotency
+import profiling
+import retention
+import scheduler
+import spool
+import stats
+import suppression
+from compression import CompressionMiddleware
+from config import get_config
+from coordination import lease
+from db import (
+    Address,
+    EmailHistory,
+    ScheduledCampaign,
+    SessionLocal,
+    Suppression,
+    column_dicts,
+    get_db,
+    init_db,
+)
 from dependencies import save_upload_files
-from email_sender import EmailSender
 from logger_config import setup_logger
-from schemas import AddressCreate, EmailRequest
+from schemas import (
+    AddressCreate,
+    BatchEmailRequest,
+    EmailRequest,
+    ScheduledCampaignRequest,
+)
+from send_service import Campaign, record_history
+from sender_pool import get_sender_pool
+from templating import TemplateError
 import asyncio
 import logging
 
@@ -32,10 +61,50 @@ load_dotenv()
 # Create logger
 logger = setup_logger("main")
 
-# Create tables
-Base.metadata.create_all(bind=engine)
+# Configure paths
+config = get_config()
+UPLOAD_FOLDER = Path(config.UPLOAD_FOLDER)
+
 
-app = FastAPI(title="Email Sender API")
+def startup() -> None:
+    """One-time startup work, kept out of import so workers load fast."""
+    config.ensure_directories()
+    config.log_settings()
+    # A broken SMTP_ACCOUNTS_FILE fails startup rather than every send
+    get_sender_pool(config)
+    init_db()
+    # Workers starting together only need one of them to rescan the folder.
+    # Released once done, so a restart shortly after still rescans.
+    with lease("file-catalog-sync", timedelta(minutes=5)) as acquired:
+        if acquired:
+            with SessionLocal() as db:
+                file_catalog.sync_catalog(db, UPLOAD_FOLDER)
+    with lease("send-stats-backfill", timedelta(minutes=5)) as acquired:
+        if acquired:
+            with SessionLocal() as db:
+                stats.backfill(db)
+
+
+dispatcher = scheduler.Dispatcher()
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    await run_in_threadpool(startup)
+    dispatcher.start()
+    tasks = [
+        asyncio.create_task(retention.run_periodically()),
+        asyncio.create_task(cleanup_periodically()),
+    ]
+    yield
+    for task in tasks:
+        task.cancel()
+        with suppress(asyncio.CancelledError):
+            await task
+    await dispatcher.stop()
+
+
+app = FastAPI(title="Email Sender API", lifespan=lifespan)
 
 # CORS middleware
 # Read and process the allowed origins
@@ -78,15 +147,23 @@ class CORSLoggingMiddleware(BaseHTTPMiddleware):
 
         return response
 
+# Innermost, so fast rejections still get CORS headers and reach the
+# slow-request log; it runs before any request body is read
+app.add_middleware(admission.AdmissionMiddleware)
+
+# gzip/brotli above 1 KiB. Added before the logging middleware so it sees
+# whole response bodies; BaseHTTPMiddleware re-streams them in pieces.
+app.add_middleware(CompressionMiddleware, minimum_size=1024)
+
 # Add the CORS logging middleware before the CORS middleware
 app.add_middleware(CORSLoggingMiddleware)
 
 # Update the existing CORS middleware configuration with more detailed logging
-logger.info("Configuring CORS middleware with the following settings:")
-logger.info(f"Allowed origins: {origins}")
-logger.info("Allow credentials: True")
-logger.info("Allow methods: ['*']")
-logger.info("Allow headers: ['*']")
+logger.debug("Configuring CORS middleware with the following settings:")
+logger.debug(f"Allowed origins: {origins}")
+logger.debug("Allow credentials: True")
+logger.debug("Allow methods: ['*']")
+logger.debug("Allow headers: ['*']")
 
 app.add_middleware(
     CORSMiddleware,
@@ -95,19 +172,10 @@ app.add_middleware(
     allow_methods=["*"],
     allow_headers=["*"],
 )
+# Outermost, so its timings cover the whole request
+app.add_middleware(profiling.ProfilingMiddleware)
 
-# Configure paths
-config = Config()
-UPLOAD_FOLDER = Path(config.UPLOAD_FOLDER)
-UPLOAD_FOLDER.mkdir(exist_ok=True)
-
-DATA_DIR = Path(__file__).parent / "data"
-DATA_DIR.mkdir(exist_ok=True)
-
-# Directory to store uploaded files
-UPLOAD_DIR = "uploads"
-if not os.path.exists(UPLOAD_DIR):
-    os.makedirs(UPLOAD_DIR)
+CLEANUP_INTERVAL = timedelta(hours=1)
 
 # Function to get file age in days
 def get_file_age(file_path):
@@ -115,26 +183,82 @@ def get_file_age(file_path):
 
 # Function to clean up old files
 def cleanup_old_files():
-    try:
-        for filename in os.listdir(UPLOAD_DIR):
-            file_path = os.path.join(UPLOAD_DIR, filename)
-            if os.path.isfile(file_path):
-                file_age = get_file_age(file_path)
-                if file_age >= 30:  # 30 days = 1 month
-                    try:
-                        os.remove(file_path)
-                        logging.info(f"Deleted old file: {file_path}")
-                    except Exception as e:
-                        logging.error(f"Error deleting file {file_path}: {str(e)}")
-    except Exception as e:
-        logging.error(f"Error in cleanup: {str(e)}")
+    # Only one worker sweeps the upload folder per interval; the lease is
+    # left to expire rather than released so the sweep runs at most hourly.
+    with lease("cleanup-old-files", CLEANUP_INTERVAL, release=False) as acquired:
+        if not acquired:
+            return
+        removed = []
+        try:
+            for filename in os.listdir(UPLOAD_FOLDER):
+                file_path = os.path.join(UPLOAD_FOLDER, filename)
+                if os.path.isfile(file_path):
+                    file_age = get_file_age(file_path)
+                    if file_age >= 30:  # 30 days = 1 month
+                        try:
+                            os.remove(file_path)
+                            removed.append(file_path)
+                            logging.info(f"Deleted old file: {file_path}")
+                        except Exception as e:
+                            logging.error(f"Error deleting file {file_path}: {str(e)}")
+        except Exception as e:
+            logging.error(f"Error in cleanup: {str(e)}")
+        bundles.cleanup_bundles(max_age_days=30)
+        with SessionLocal() as db:
+            if removed:
+                spool.remove_spools(removed)
+                file_catalog.remove_files(db, removed)
+            idempotency.purge_expired(db)
+
+
+async def cleanup_periodically() -> None:
+    """Lifespan task sweeping old uploads, off the event loop."""
+    while True:
+        try:
+            await run_in_threadpool(cleanup_old_files)
+        except Exception as e:
+            logger.error(f"Error cleaning up old files: {str(e)}", exc_info=True)
+        await asyncio.sleep(CLEANUP_INTERVAL.total_seconds())
+
 
 @app.get("/api/health")
 def health_check():
-    return {"status": "healthy"}
+    # Saturation is reported but keeps the 200, so health checks do not
+    # restart a worker that is only busy
+    load = admission.saturation()
+    saturated = any(gate["saturated"] for gate in load.values())
+    return {"status": "busy" if saturated else "healthy", "admission": load}
+
+def require_debug_key(x_debug_key: Optional[str] = Header(None)):
+    """Allow debug routes only with SECRET_KEY in the X-Debug-Key header."""
+    if not profiling.debug_key_valid(x_debug_key):
+        raise HTTPException(status_code=403, detail="Invalid debug key")
+
+
+@app.get("/api/debug/slow-requests", dependencies=[Depends(require_debug_key)])
+def get_slow_requests():
+    """Recent slow requests on this worker with per-phase timings."""
+    return profiling.slow_requests()
+
+
+@app.get(
+    "/api/debug/profiles/{profile_id}",
+    dependencies=[Depends(require_debug_key)],
+)
+def get_profile(profile_id: str):
+    """A stored request profile as folded stacks (flame graph input)."""
+    folded = profiling.stored_profile(profile_id)
+    if folded is None:
+        raise HTTPException(status_code=404, detail="Profile not found")
+    return Response(folded, media_type="text/plain")
+
 
 @app.post("/api/upload")
-async def upload_files(files: List[UploadFile] = File(...)):
+async def upload_files(
+    background_tasks: BackgroundTasks,
+    files: List[UploadFile] = File(...),
+    db: Session = Depends(get_db),
+):
     """Upload multiple files and return their paths"""
     file_paths = []
     try:
@@ -151,110 +275,246 @@ async def upload_files(files: List[UploadFile] = File(...)):
 
             file_path = os.path.join(UPLOAD_FOLDER, safe_filename)
 
-            # Avoid overwriting existing files with same name
+            # Avoid overwriting existing files with same name. Exclusive
+            # creation claims the name atomically, so two workers uploading
+            # the same filename at once cannot clobber each other.
             counter = 1
             original_file_path = file_path
-            while os.path.exists(file_path):
-                name, ext = os.path.splitext(original_file_path)
-                file_path = f"{name}_{counter}{ext}"
-                counter += 1
+            while True:
+                try:
+                    f = open(file_path, "xb")
+                    break
+                except FileExistsError:
+                    name, ext = os.path.splitext(original_file_path)
+                    file_path = f"{name}_{counter}{ext}"
+                    counter += 1
 
             # Save the file
-            with open(file_path, "wb") as f:
+            with profiling.phase("file_io"), f:
                 f.write(await file.read())
 
             file_paths.append({"name": safe_filename, "path": file_path})
 
+        saved_paths = [f["path"] for f in file_paths]
+        file_catalog.add_files(db, saved_paths)
+        # Pre-encode attachments after responding, so sends skip base64
+        background_tasks.add_task(spool.spool_files, saved_paths)
         return {"files": file_paths}
     except Exception as e:
         logger.error(f"Error uploading files: {str(e)}", exc_info=True)
         raise HTTPException(status_code=500, detail=str(e))
 
 
-@app.post("/api/send-email")
-async def send_email(email_request: EmailRequest, db: Session = Depends(get_db)):
-    logger.info("Starting email send process...")
+def bundle_name_for(request) -> Optional[str]:
+    """Archive name for requests that opted into bundling, else None."""
+    return bundles.safe_bundle_name(request.bundle_name) if request.bundle else None
+
+
+async def run_idempotent(
+    db: Session, key: Optional[str], endpoint: str, payload, handler
+):
+    """Run ``handler`` once per Idempotency-Key and replay its result.
+
+    Without a key the handler simply runs. A repeated key returns the
+    stored result instead of sending again; failed requests free the key.
+    """
+    if not key:
+        return await handler()
     try:
-        # Check if recipient is active
-        recipient = (
-            db.query(Address)
-            .filter(Address.email == email_request.receiver_email)
-            .first()
-        )
+        stored = idempotency.claim(db, key, endpoint, payload)
+    except idempotency.KeyReused as e:
+        raise HTTPException(status_code=422, detail=str(e))
+    except idempotency.RequestInProgress as e:
+        raise HTTPException(status_code=409, detail=str(e))
+    if stored is not None:
+        return JSONResponse(stored, headers={"Idempotent-Replayed": "true"})
+
+    try:
+        async with idempotency.heartbeat(key):
+            result = await handler()
+    except BaseException:
+        idempotency.release(db, key)
+        raise
+    idempotency.complete(db, key, result)
+    return result
+
+
+@app.post("/api/send-email")
+async def send_email(
+    email_request: EmailRequest,
+    db: Session = Depends(get_db),
+    idempotency_key: Optional[str] = Header(None),
+):
+    return await run_idempotent(
+        db,
+        idempotency_key,
+        "send-email",
+        email_request,
+        lambda: _send_email(email_request, db),
+    )
 
-        if recipient and recipient.status == "inactive":
-            return {
-                "success": False,
-                "message": f"Email not sent: {email_request.receiver_email} is marked as inactive",
-            }
 
+async def _send_email(email_request: EmailRequest, db: Session):
+    logger.info("Starting email send process...")
+    try:
         # Log request data (excluding sensitive info)
         logger.debug(f"Received email request for: {email_request.receiver_email}")
 
         # Validate files
-        files_to_send = [f["path"] for f in email_request.files]
-        for file_path in files_to_send:
+        for file_path in [f["path"] for f in email_request.files]:
             if not os.path.exists(file_path):
                 raise HTTPException(
                     status_code=400, detail=f"File not found: {file_path}"
                 )
 
-        # Configure email sender
-        smtp_config = {
-            "smtp_server": config.SMTP_SERVER,
-            "port": config.SMTP_PORT,
-            "sender_email": config.SENDER_EMAIL,
-            "password": config.SMTP_PASSWORD,
-        }
-
-        email_sender = EmailSender(smtp_config)
-        result = email_sender.send_email(
-            receiver_email=email_request.receiver_email,
-            subject=email_request.subject,
-            body=email_request.body,
-            files=files_to_send,
+        campaign = Campaign(
+            config,
+            email_request.subject,
+            email_request.body,
+            bundle_name=bundle_name_for(email_request),
+            # Single sends predate templates; text that merely looks like an
+            # unknown placeholder is sent as written
+            strict_templates=False,
         )
 
-        # Clean up old files after sending email
-        cleanup_old_files()
-
-        # Save to email history regardless of success
-        history = EmailHistory(
-            recipient_name=email_request.recipient_name,
-            recipient_email=email_request.receiver_email,
-            subject=email_request.subject,
-            files=json.dumps([f["name"] for f in email_request.files]),
-            status="success" if result["success"] else "error",
-            message=result["message"],
-        )
-        db.add(history)
-        db.commit()
-
-        if not result["success"]:
-            logger.error(f"Email sending failed: {result['message']}")
-            return result
+        def send() -> dict:
+            with campaign:
+                return campaign.send(
+                    db,
+                    receiver_email=email_request.receiver_email,
+                    recipient_name=email_request.recipient_name,
+                    files=email_request.files,
+                )
 
-        return result
+        # SMTP calls block; keep the event loop free for other requests
+        return await run_in_threadpool(send)
 
     except HTTPException:
         raise
+    except TemplateError as e:
+        raise HTTPException(status_code=400, detail=str(e))
     except Exception as e:
         error_msg = f"Unexpected error in send_email: {str(e)}"
         logger.error(error_msg, exc_info=True)
         # Save unexpected errors to history
-        history = EmailHistory(
-            recipient_name=email_request.recipient_name,
-            recipient_email=email_request.receiver_email,
-            subject=email_request.subject,
-            files=json.dumps([f["name"] for f in email_request.files]),
-            status="error",
-            message=error_msg,
+        record_history(
+            db,
+            email_request.recipient_name,
+            email_request.receiver_email,
+            email_request.subject,
+            [f["name"] for f in email_request.files],
+            False,
+            error_msg,
         )
-        db.add(history)
-        db.commit()
         raise HTTPException(status_code=500, detail=error_msg)
 
 
+@app.post("/api/send-batch")
+async def send_batch(
+    batch: BatchEmailRequest,
+    db: Session = Depends(get_db),
+    idempotency_key: Optional[str] = Header(None),
+):
+    """Send one templated subject/body to many recipients.
+
+    Templates are compiled once and a single SMTP session and attachment
+    encoding are shared by all recipients. Failures are reported per
+    recipient instead of failing the whole batch.
+    """
+    return await run_idempotent(
+        db, idempotency_key, "send-batch", batch, lambda: _send_batch(batch, db)
+    )
+
+
+async def _send_batch(batch: BatchEmailRequest, db: Session):
+    logger.info(f"Starting batch send to {len(batch.recipients)} recipients")
+    try:
+        campaign = Campaign(
+            config, batch.subject, batch.body, bundle_name=bundle_name_for(batch)
+        )
+    except TemplateError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+    def send_all() -> list:
+        results = []
+        with campaign:
+            for recipient in batch.recipients:
+                missing = [
+                    f["path"]
+                    for f in recipient.files
+                    if not os.path.exists(f["path"])
+                ]
+                if missing:
+                    result = {
+                        "success": False,
+                        "message": f"File not found: {missing[0]}",
+                    }
+                else:
+                    result = campaign.send(
+                        db,
+                        receiver_email=recipient.receiver_email,
+                        recipient_name=recipient.recipient_name,
+                        files=recipient.files,
+                    )
+                results.append(
+                    {"receiver_email": recipient.receiver_email, **result}
+                )
+        return results
+
+    # SMTP calls block; keep the event loop free for other requests
+    results = await run_in_threadpool(send_all)
+
+    sent = sum(1 for r in results if r["success"])
+    response = {"sent": sent, "failed": len(results) - sent, "results": results}
+    if batch.bundle:
+        response["bytes_saved"] = sum(r.get("bytes_saved", 0) for r in results)
+    return response
+
+
+@app.post("/api/campaigns")
+async def create_campaign(
+    request: ScheduledCampaignRequest,
+    db: Session = Depends(get_db),
+    idempotency_key: Optional[str] = Header(None),
+):
+    """Schedule a batch send spread over time instead of sent at once."""
+
+    async def schedule():
+        try:
+            return scheduler.schedule_campaign(db, request).to_dict()
+        except TemplateError as e:
+            raise HTTPException(status_code=400, detail=str(e))
+
+    return await run_idempotent(
+        db, idempotency_key, "campaigns", request, schedule
+    )
+
+
+@app.get("/api/campaigns")
+async def list_campaigns(db: Session = Depends(get_db)):
+    campaigns = (
+        db.query(ScheduledCampaign).order_by(ScheduledCampaign.start_at.desc()).all()
+    )
+    return [campaign.to_dict() for campaign in campaigns]
+
+
+@app.get("/api/campaigns/{campaign_id}")
+async def get_campaign(campaign_id: int, db: Session = Depends(get_db)):
+    campaign = db.get(ScheduledCampaign, campaign_id)
+    if not campaign:
+        raise HTTPException(status_code=404, detail="Campaign not found")
+    return campaign.to_dict()
+
+
+@app.delete("/api/campaigns/{campaign_id}")
+async def cancel_campaign(campaign_id: int, db: Session = Depends(get_db)):
+    """Cancel the campaign's messages that have not been sent yet."""
+    campaign = scheduler.cancel_campaign(db, campaign_id)
+    if not campaign:
+        raise HTTPException(status_code=404, detail="Campaign not found")
+    return campaign.to_dict()
+
+
 @app.get("/api/email-history")
 async def get_email_history(
     db: Session = Depends(get_db),
@@ -263,10 +523,12 @@ async def get_email_history(
     status: Optional[str] = None,
     date_from: Optional[datetime] = None,
     date_to: Optional[datetime] = None,
+    include_archived: bool = False,
 ):
     try:
         logger.debug("Handling email history request")
-        query = db.query(EmailHistory)
+        # Column-level query: rows become dicts without building ORM objects
+        query = db.query(*EmailHistory.dict_columns())
 
         if recipient:
             query = query.filter(
@@ -288,30 +550,56 @@ async def get_email_history(
         if date_to:
             query = query.filter(EmailHistory.created_at <= date_to)
 
-        history = query.order_by(EmailHistory.created_at.desc()).all()
-        return [h.to_dict() for h in history]
+        query = query.order_by(EmailHistory.created_at.desc())
+        rows = column_dicts(query)
+        if include_archived:
+            # Archived rows are all older than the ones still in the table
+            rows += await run_in_threadpool(
+                retention.search_archives,
+                recipient, subject, status, date_from, date_to,
+            )
+        return ORJSONResponse(rows)
 
     except Exception as e:
         logger.error(f"Error retrieving email history: {str(e)}", exc_info=True)
         raise HTTPException(status_code=500, detail=str(e))
 
 
+@app.get("/api/stats")
+async def get_stats(
+    db: Session = Depends(get_db),
+    date_from: Optional[date] = None,
+    date_to: Optional[date] = None,
+):
+    """Send counts, bytes sent and failure reasons per day.
+
+    Read from the rollup maintained with each history row, so the cost
+    depends on the number of days, not on the size of the history.
+    """
+    return stats.summary(db, date_from, date_to)
+
+
 # In main.py, update the get_addresses function to filter by status
 @app.get("/api/addresses")
 async def get_addresses(db: Session = Depends(get_db), status: Optional[str] = None):
-    query = db.query(Address)
+    query = db.query(*Address.dict_columns())
     if status:
         query = query.filter(Address.status == status)
-    addresses = query.all()
-    return [address.to_dict() for address in addresses]
+    return ORJSONResponse(column_dicts(query))
+
+
+@app.get("/api/sender-accounts")
+def get_sender_accounts(db: Session = Depends(get_db)):
+    """Quota usage and failover state of each sender account."""
+    return get_sender_pool(config).status(db)
 
 
 # In main.py, update the showConfirmation function in EmailSenderPage to filter inactive addresses
 # This is referenced in your frontend code, so we need to modify the backend endpoint
 @app.get("/api/active-addresses")
 async def get_active_addresses(db: Session = Depends(get_db)):
-    addresses = db.query(Address).filter(Address.status == "active").all()
-    return [address.to_dict() for address in addresses]
+    query = db.query(*Address.dict_columns()).filter(Address.status == "active")
+    return ORJSONResponse(column_dicts(query))
 
 
 @app.post("/api/addresses")
@@ -357,6 +645,25 @@ async def delete_address(address_id: int, db: Session = Depends(get_db)):
     return {"success": True}
 
 
+@app.get("/api/suppressions")
+async def get_suppressions(db: Session = Depends(get_db)):
+    """Recipients no longer sent to after hard bounces or refusals."""
+    entries = (
+        db.query(Suppression)
+        .filter(Suppression.suppressed)
+        .order_by(Suppression.updated_at.desc())
+        .all()
+    )
+    return [entry.to_dict() for entry in entries]
+
+
+@app.delete("/api/suppressions/{email}")
+async def delete_suppression(email: str, db: Session = Depends(get_db)):
+    if not suppression.remove(db, email):
+        raise HTTPException(status_code=404, detail="Suppression not found")
+    return {"success": True}
+
+
 # Example of setting a cookie
 @app.post("/api/set-cookie")
 async def set_cookie(response: Response):
@@ -380,30 +687,29 @@ async def get_cookie(session_id: Optional[str] = Cookie(None)):
 
 
 @app.get("/api/files")
-async def list_files():
-    """List all files in the upload directory"""
+async def list_files(
+    db: Session = Depends(get_db),
+    offset: int = Query(0, ge=0),
+    limit: Optional[int] = Query(None, ge=1),
+    sort: Literal["name", "size", "created"] = "created",
+    order: Literal["asc", "desc"] = "desc",
+    prefix: Optional[str] = None,
+):
+    """List uploaded files from the catalog, one page at a time"""
     try:
-        files = []
-        for file_path in glob.glob(f"{UPLOAD_FOLDER}/*"):
-            # Ensure the file name is properly decoded for display
-            file_name = os.path.basename(file_path)
-            file_info = {
-                "name": file_name,
-                "path": file_path,
-                "size": os.path.getsize(file_path),
-                "created": datetime.fromtimestamp(
-                    os.path.getctime(file_path)
-                ).isoformat(),
-            }
-            files.append(file_info)
-        return {"files": files}
+        files, total = file_catalog.list_files(
+            db, offset=offset, limit=limit, sort=sort, order=order, prefix=prefix
+        )
+        return ORJSONResponse({"files": files, "total": total})
     except Exception as e:
         logger.error(f"Error listing files: {str(e)}", exc_info=True)
         raise HTTPException(status_code=500, detail=str(e))
 
 
 @app.delete("/api/files")
-async def delete_files(file_paths: List[str] = None):
+async def delete_files(
+    file_paths: List[str] = None, db: Session = Depends(get_db)
+):
     """Delete specified files or all files if none specified"""
     try:
         if not file_paths:
@@ -411,19 +717,29 @@ async def delete_files(file_paths: List[str] = None):
             for file_path in glob.glob(f"{UPLOAD_FOLDER}/*"):
                 os.remove(file_path)
                 logger.debug(f"Deleted file: {file_path}")
+            spool.clear_spool(UPLOAD_FOLDER)
+            file_catalog.remove_files(db)
             return {"message": "All files deleted successfully"}
         else:
             # Delete specified files
+            removed = []
             for file_path in file_paths:
-                if os.path.exists(file_path) and os.path.dirname(file_path) == str(
-                    UPLOAD_FOLDER
-                ):
+                if os.path.dirname(file_path) != str(UPLOAD_FOLDER):
+                    logger.warning(
+                        f"File not found or outside upload directory: {file_path}"
+                    )
+                    continue
+                if os.path.exists(file_path):
                     os.remove(file_path)
                     logger.debug(f"Deleted file: {file_path}")
                 else:
                     logger.warning(
                         f"File not found or outside upload directory: {file_path}"
                     )
+                # Drop the entry even if the file was already gone
+                removed.append(file_path)
+            spool.remove_spools(removed)
+            file_catalog.remove_files(db, removed)
             return {"message": f"{len(file_paths)} files deleted successfully"}
     except Exception as e:
         logger.error(f"Error deleting files: {str(e)}", exc_info=True)
@@ -437,9 +753,16 @@ if __name__ == "__main__":
     port = int(port_str)
     logger.info(f"port={port}")
 
+    reload = os.getenv("BACKEND_DEBUG", "false").lower() == "true"
+    # Same variable uvicorn's CLI reads; reload only works with one worker
+    workers = int(os.getenv("WEB_CONCURRENCY", "1"))
+    if reload and workers > 1:
+        logger.warning("BACKEND_DEBUG reload ignores WEB_CONCURRENCY")
+        workers = 1
+
     uvicorn.run(
         "main:app",
-        reload=os.getenv("BACKEND_DEBUG", "false").lower()
-        == "true",  # Use BACKEND_DEBUG to control reload
+        reload=reload,  # Use BACKEND_DEBUG to control reload
         port=port,
+        workers=workers,
     )
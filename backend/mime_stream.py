@@ -0,0 +1,152 @@
+import os
+import urllib.parse
+import uuid
+from email.generator import BytesGenerator
+from email.mime.base import MIMEBase
+from email.mime.multipart import MIMEMultipart
+from email.mime.text import MIMEText
+from email.policy import compat32
+from io import BytesIO
+from pathlib import Path
+from typing import Iterator, List, Optional
+
+import spool
+
+# Same serialization smtplib.send_message uses for compat32 messages
+WIRE_POLICY = compat32.clone(linesep="\r\n")
+
+
+def new_boundary() -> str:
+    return f"==============={uuid.uuid4().hex}=="
+
+
+def header_block(message) -> bytes:
+    """Serialize only the headers of ``message`` plus the blank line."""
+    return b"".join(
+        WIRE_POLICY.fold_binary(name, value) for name, value in message.items()
+    ) + b"\r\n"
+
+
+def part_bytes(part) -> bytes:
+    buffer = BytesIO()
+    BytesGenerator(buffer, mangle_from_=False, policy=WIRE_POLICY).flatten(part)
+    return buffer.getvalue()
+
+
+class FileSegment:
+    """An already encoded file sent as-is, e.g. with ``socket.sendfile``."""
+
+    dot_safe = True
+
+    def __init__(self, path: Path):
+        self.path = path
+        self.size = os.path.getsize(path)
+
+    def iter_chunks(self, chunk_size: int) -> Iterator[bytes]:
+        with open(self.path, "rb") as f:
+            for block in iter(lambda: f.read(chunk_size), b""):
+                yield block
+
+
+class Base64Segment:
+    """A raw file base64-encoded on the fly while it is sent."""
+
+    dot_safe = True
+
+    def __init__(self, path: str):
+        self.source = path
+        self.size = spool.encoded_size(os.path.getsize(path))
+
+    def iter_chunks(self, chunk_size: int) -> Iterator[bytes]:
+        # Encoding 57-byte lines grows them to 78 bytes with CRLF
+        return spool.iter_base64(self.source, max(chunk_size * 57 // 78, 57))
+
+
+class Attachment:
+    """Headers and encoded body of one attachment part.
+
+    Built once per file and shared by every message that attaches it.
+    """
+
+    def __init__(self, file_path: str):
+        part = MIMEBase("application", "octet-stream")
+        part["Content-Transfer-Encoding"] = "base64"
+
+        # Get original filename and decode if it's URL encoded
+        filename = os.path.basename(file_path)
+        if "%" in filename:
+            filename = urllib.parse.unquote(filename)
+        part.add_header(
+            "Content-Disposition",
+            "attachment",
+            filename=("utf-8", "", filename),  # RFC 2231 encoding
+        )
+        self.headers = header_block(part)
+
+        # Prefer the pre-encoded spool written after upload
+        spooled = spool.spooled(file_path)
+        self.body = FileSegment(spooled) if spooled else Base64Segment(file_path)
+
+
+class StreamingMessage:
+    """A multipart/mixed message serialized as a list of segments.
+
+    Headers and the text part are small ``bytes``; attachment bodies are
+    streamed from disk by the SMTP client instead of being held in memory
+    as one flattened string.
+    """
+
+    def __init__(
+        self,
+        sender: str,
+        receiver: str,
+        subject: str,
+        boundary: Optional[str] = None,
+    ):
+        self.boundary = boundary or new_boundary()
+        root = MIMEMultipart(boundary=self.boundary)
+        root["From"] = sender
+        root["To"] = receiver
+        root["Subject"] = subject
+        self.headers = header_block(root)
+        self._parts: List = []
+
+    def attach_bytes(self, data: bytes) -> None:
+        """Attach a part already serialized with ``part_bytes``."""
+        self._parts.append((data,))
+
+    def attach(self, attachment: Attachment) -> None:
+        self._parts.append((attachment.headers, attachment.body))
+
+    @property
+    def body_segments(self) -> List:
+        """Everything after the top-level header block."""
+        delimiter = f"--{self.boundary}\r\n".encode()
+        segments: List = []
+        for part in self._parts:
+            segments.append(delimiter + part[0])
+            segments.extend(part[1:])
+            segments.append(b"\r\n")
+        segments.append(f"--{self.boundary}--\r\n".encode())
+        return segments
+
+    @property
+    def segments(self) -> List:
+        return [self.headers] + self.body_segments
+
+    @property
+    def size(self) -> int:
+        return sum(
+            len(s) if isinstance(s, bytes) else s.size for s in self.segments
+        )
+
+    def as_bytes(self) -> bytes:
+        """Fully serialized message; only for tests and debugging."""
+        return b"".join(
+            s if isinstance(s, bytes) else b"".join(s.iter_chunks(65536))
+            for s in self.segments
+        )
+
+
+def text_part(body: str) -> bytes:
+    return part_bytes(MIMEText(body, "plain"))
@@ -0,0 +1,221 @@
+import hmac
+import sys
+import threading
+import time
+import uuid
+from collections import Counter, OrderedDict, deque
+from contextlib import contextmanager
+from contextvars import ContextVar
+from datetime import datetime
+from typing import Dict, Iterator, List, Optional
+
+from sqlalchemy import event
+from starlette.datastructures import Headers, MutableHeaders, QueryParams
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+from config import get_config
+from db import engine
+from logger_config import setup_logger
+
+logger = setup_logger("profiling")
+
+# The shipped default key is public, so it never unlocks debugging
+DEFAULT_SECRET_KEY = "dev-key-please-change"
+SAMPLE_INTERVAL = 0.005
+MAX_STORED_PROFILES = 20
+
+# Seconds spent per phase ("db", "smtp", "file_io") by the current request
+_phases: ContextVar[Optional[Dict[str, float]]] = ContextVar(
+    "request_phases", default=None
+)
+
+_slow_requests: deque = deque(maxlen=get_config().SLOW_REQUEST_BUFFER)
+_profiles: "OrderedDict[str, str]" = OrderedDict()
+_profiles_lock = threading.Lock()
+
+
+def add_time(name: str, seconds: float) -> None:
+    phases = _phases.get()
+    if phases is not None:
+        phases[name] = phases.get(name, 0.0) + seconds
+
+
+@contextmanager
+def phase(name: str) -> Iterator[None]:
+    """Count the time spent in the block towards the request's ``name``."""
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        add_time(name, time.perf_counter() - start)
+
+
+@event.listens_for(engine, "before_cursor_execute")
+def _before_execute(conn, cursor, statement, parameters, context, executemany):
+    conn.info.setdefault("query_start", []).append(time.perf_counter())
+
+
+@event.listens_for(engine, "after_cursor_execute")
+def _after_execute(conn, cursor, statement, parameters, context, executemany):
+    add_time("db", time.perf_counter() - conn.info["query_start"].pop())
+    add_time("db_queries", 1)
+
+
+def debug_key_valid(key: Optional[str]) -> bool:
+    secret = get_config().SECRET_KEY
+    if not key or not secret or secret == DEFAULT_SECRET_KEY:
+        return False
+    return hmac.compare_digest(key.encode(), secret.encode())
+
+
+def request_debug_key(scope: Scope) -> Optional[str]:
+    """Debug key from the X-Debug-Key header.
+
+    Never read from the query string, which access logs record.
+    """
+    return Headers(scope=scope).get("x-debug-key")
+
+
+def slow_requests() -> List[Dict]:
+    return list(_slow_requests)
+
+
+def stored_profile(profile_id: str) -> Optional[str]:
+    with _profiles_lock:
+        return _profiles.get(profile_id)
+
+
+def _store_profile(folded: str) -> str:
+    profile_id = uuid.uuid4().hex[:12]
+    with _profiles_lock:
+        _profiles[profile_id] = folded
+        while len(_profiles) > MAX_STORED_PROFILES:
+            _profiles.popitem(last=False)
+    return profile_id
+
+
+class Sampler:
+    """Stdlib sampling profiler producing folded stacks.
+
+    A background thread records the stack of every other thread each
+    ``interval`` seconds. The output is one ``frame;frame;frame count``
+    line per distinct stack, the input format of flame graph tools.
+    Concurrent requests on the same worker show up in the samples too.
+    """
+
+    def __init__(self, interval: float = SAMPLE_INTERVAL):
+        self.interval = interval
+        self.samples: Counter = Counter()
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+
+    def start(self) -> None:
+        self._thread.start()
+
+    def stop(self) -> None:
+        if not self._stop.is_set():
+            self._stop.set()
+            self._thread.join()
+
+    def _run(self) -> None:
+        own_id = threading.get_ident()
+        while not self._stop.wait(self.interval):
+            for thread_id, frame in sys._current_frames().items():
+                if thread_id == own_id:
+                    continue
+                stack = []
+                while frame is not None:
+                    code = frame.f_code
+                    stack.append(
+                        f"{code.co_name} ({code.co_filename}:{frame.f_lineno})"
+                    )
+                    frame = frame.f_back
+                self.samples[";".join(reversed(stack))] += 1
+
+    def folded(self) -> str:
+        return "\n".join(
+            f"{stack} {count}" for stack, count in self.samples.most_common()
+        )
+
+
+class ProfilingMiddleware:
+    """Per-phase timings for every request, profiles on request.
+
+    Requests slower than SLOW_REQUEST_MS are appended to a bounded ring
+    buffer. With a valid debug key plus an ``X-Profile`` header or
+    ``profile`` query flag, the request also runs under the Sampler and
+    the stored profile's id is returned in ``X-Profile-Id``.
+    """
+
+    def __init__(self, app: ASGIApp):
+        self.app = app
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        wants_profile = "x-profile" in Headers(scope=scope) or "profile" in (
+            QueryParams(scope.get("query_string", b""))
+        )
+        sampler = None
+        if wants_profile and debug_key_valid(request_debug_key(scope)):
+            sampler = Sampler()
+        phases: Dict[str, float] = {}
+        token = _phases.set(phases)
+        start = time.perf_counter()
+        state = {"status": None, "finished": None, "profile_id": None}
+
+        async def send_with_timing(message: Message) -> None:
+            if message["type"] == "http.response.start":
+                state["status"] = message["status"]
+                if sampler is not None:
+                    # The handler is done once the response starts
+                    sampler.stop()
+                    state["profile_id"] = _store_profile(sampler.folded())
+                    MutableHeaders(scope=message)["X-Profile-Id"] = state[
+                        "profile_id"
+                    ]
+            elif message["type"] == "http.response.body" and not message.get(
+                "more_body", False
+            ):
+                state["finished"] = time.perf_counter()
+            await send(message)
+
+        if sampler is not None:
+            sampler.start()
+        try:
+            await self.app(scope, receive, send_with_timing)
+        finally:
+            if sampler is not None:
+                sampler.stop()
+            _phases.reset(token)
+            self._record(scope, start, state, phases)
+
+    @staticmethod
+    def _record(scope: Scope, start: float, state: Dict, phases: Dict) -> None:
+        duration = (state["finished"] or time.perf_counter()) - start
+        if duration * 1000 < get_config().SLOW_REQUEST_MS:
+            return
+        timings = {
+            f"{name}_ms": round(seconds * 1000, 1)
+            for name, seconds in phases.items()
+            if name != "db_queries"
+        }
+        measured = sum(v for k, v in phases.items() if k != "db_queries")
+        timings["other_ms"] = round(max(duration - measured, 0) * 1000, 1)
+        entry = {
+            "at": datetime.now().isoformat(),
+            "method": scope["method"],
+            "path": scope["path"],
+            "status": state["status"],
+            "duration_ms": round(duration * 1000, 1),
+            "db_queries": int(phases.get("db_queries", 0)),
+            "phases": timings,
+            "profile_id": state["profile_id"],
+        }
+        _slow_requests.append(entry)
+        logger.warning(
+            f"Slow request {entry['method']} {entry['path']}: "
+            f"{entry['duration_ms']} ms {timings}"
+        )
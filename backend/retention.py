@@ -0,0 +1,273 @@
+import asyncio
+import gzip
+import io
+import os
+import re
+from datetime import date, datetime, timedelta
+from pathlib import Path
+from typing import Dict, Iterator, List, Optional
+
+import orjson
+from fastapi.concurrency import run_in_threadpool
+from sqlalchemy.orm import Session
+
+from config import get_config
+from coordination import lease
+from db import EmailHistory, SessionLocal, column_dicts, engine
+from logger_config import setup_logger
+
+try:
+    import zstandard
+except ImportError:  # zstd is optional; archives fall back to gzip
+    zstandard = None
+
+logger = setup_logger("retention")
+
+BATCH_SIZE = 1000
+# Free pages returned to the filesystem after each deleted batch
+VACUUM_PAGES = 2000
+CHECK_INTERVAL = timedelta(hours=1)
+RUN_INTERVAL = timedelta(hours=24)
+_ARCHIVE_NAME = re.compile(
+    r"^email_history-(\d{4}-\d{2}-\d{2})\.ndjson\.(zst|gz)$"
+)
+
+
+def archive_dir() -> Path:
+    return get_config().DATA_DIR / "history_archive"
+
+
+def _compress(data: bytes):
+    """Return the compressed frame and the file suffix it belongs in."""
+    if zstandard is not None:
+        return zstandard.ZstdCompressor(level=10).compress(data), "zst"
+    return gzip.compress(data, compresslevel=6), "gz"
+
+
+def _append_archive(day: date, rows: List[Dict]) -> Path:
+    """Append rows as one compressed frame to the day's archive.
+
+    zstd frames and gzip members can be concatenated, so each batch is
+    appended without rewriting earlier ones.
+    """
+    data = b"".join(orjson.dumps(row) + b"\n" for row in rows)
+    frame, suffix = _compress(data)
+    directory = archive_dir()
+    directory.mkdir(parents=True, exist_ok=True)
+    path = directory / f"email_history-{day.isoformat()}.ndjson.{suffix}"
+    with open(path, "ab") as f:
+        f.write(frame)
+        f.flush()
+        os.fsync(f.fileno())
+    return path
+
+
+def incremental_vacuum_enabled() -> bool:
+    with engine.connect() as connection:
+        return connection.exec_driver_sql("PRAGMA auto_vacuum").scalar() == 2
+
+
+def convert_to_incremental_vacuum() -> None:
+    """Switch an existing database to incremental auto-vacuum.
+
+    The mode only takes effect after a full VACUUM, which rewrites the
+    file under an exclusive lock, so this is a maintenance step run with
+    the app stopped (``python retention.py --convert-vacuum``). Databases
+    created since the pragma was added are incremental already.
+    """
+    if incremental_vacuum_enabled():
+        logger.info("Database already uses incremental auto-vacuum")
+        return
+    logger.info("Converting database to incremental auto-vacuum")
+    with engine.connect() as connection:
+        connection.exec_driver_sql("PRAGMA auto_vacuum=INCREMENTAL")
+        connection.exec_driver_sql("VACUUM")
+
+
+def _incremental_vacuum(pages: int) -> None:
+    # The pragma frees one page per result row, so the cursor must be
+    # drained; SQLAlchemy's execute() would stop after the first step.
+    connection = engine.raw_connection()
+    try:
+        connection.execute(f"PRAGMA incremental_vacuum({pages})").fetchall()
+    finally:
+        connection.close()
+
+
+def archive_history(db: Session, older_than_days: int) -> int:
+    """Move history rows older than the cutoff into day archives.
+
+    Rows are archived and deleted in batches of BATCH_SIZE, each followed
+    by an incremental vacuum, so writers are never locked out for long.
+    On databases not converted to incremental auto-vacuum the freed pages
+    are only reused, not returned. Returns the number of rows archived.
+    """
+    vacuum = incremental_vacuum_enabled()
+    if not vacuum:
+        logger.warning(
+            "Database is not in incremental auto-vacuum mode; archived rows "
+            "free pages for reuse but the file will not shrink. Run "
+            "'python retention.py --convert-vacuum' with the app stopped."
+        )
+    cutoff = datetime.now() - timedelta(days=older_than_days)
+    archived = 0
+    while True:
+        query = (
+            db.query(*EmailHistory.dict_columns())
+            .filter(EmailHistory.created_at < cutoff)
+            .order_by(EmailHistory.created_at)
+            .limit(BATCH_SIZE)
+        )
+        rows = column_dicts(query)
+        if not rows:
+            break
+
+        by_day: Dict[date, List[Dict]] = {}
+        for row in rows:
+            by_day.setdefault(row["created_at"].date(), []).append(row)
+        for day, day_rows in by_day.items():
+            _append_archive(day, day_rows)
+
+        # Archives are written (and synced) before the rows are deleted; a
+        # crash in between at worst leaves rows in both, and readers drop
+        # duplicate ids.
+        ids = [int(row["id"]) for row in rows]
+        db.query(EmailHistory).filter(EmailHistory.id.in_(ids)).delete(
+            synchronize_session=False
+        )
+        db.commit()
+        if vacuum:
+            _incremental_vacuum(VACUUM_PAGES)
+        archived += len(rows)
+
+    if archived:
+        logger.info(f"Archived {archived} history rows older than {cutoff}")
+    return archived
+
+
+def run_retention() -> None:
+    """Archive old history at most once a day across all workers."""
+    days = get_config().HISTORY_RETENTION_DAYS
+    if days <= 0:
+        return
+    with lease("history-retention", RUN_INTERVAL, release=False) as acquired:
+        if not acquired:
+            return
+        with SessionLocal() as db:
+            archive_history(db, days)
+
+
+async def run_periodically() -> None:
+    """Lifespan task checking every CHECK_INTERVAL whether retention is due."""
+    while True:
+        try:
+            await run_in_threadpool(run_retention)
+        except Exception as e:
+            logger.error(f"Error archiving history: {str(e)}", exc_info=True)
+        await asyncio.sleep(CHECK_INTERVAL.total_seconds())
+
+
+def _archive_files(
+    date_from: Optional[datetime], date_to: Optional[datetime]
+) -> List[Path]:
+    """Archives whose day may hold rows in the range, newest first."""
+    directory = archive_dir()
+    if not directory.exists():
+        return []
+    files = []
+    for path in directory.iterdir():
+        match = _ARCHIVE_NAME.match(path.name)
+        if not match:
+            continue
+        day = date.fromisoformat(match.group(1))
+        if date_from and day < date_from.date():
+            continue
+        if date_to and day > date_to.date():
+            continue
+        files.append((day, path))
+    return [path for _, path in sorted(files, reverse=True)]
+
+
+def _read_archive(path: Path) -> Iterator[Dict]:
+    if path.suffix == ".zst":
+        if zstandard is None:
+            logger.warning(f"Skipping {path}: zstandard is not installed")
+            return
+        raw = zstandard.ZstdDecompressor().stream_reader(
+            open(path, "rb"), read_across_frames=True, closefd=True
+        )
+        stream = io.BufferedReader(raw)
+    else:
+        stream = gzip.open(path, "rb")
+    with stream:
+        for line in stream:
+            if line.strip():
+                yield orjson.loads(line)
+
+
+def search_archives(
+    recipient: Optional[str] = None,
+    subject: Optional[str] = None,
+    status: Optional[str] = None,
+    date_from: Optional[datetime] = None,
+    date_to: Optional[datetime] = None,
+) -> List[Dict]:
+    """Archived rows matching the email history filters, newest first.
+
+    Only the day files inside the date range are opened.
+    """
+    recipient = recipient.lower() if recipient else None
+    subject = subject.lower() if subject else None
+    # Archived timestamps are naive local ISO strings, like the database's
+    if date_from and date_from.tzinfo:
+        date_from = date_from.astimezone().replace(tzinfo=None)
+    if date_to and date_to.tzinfo:
+        date_to = date_to.astimezone().replace(tzinfo=None)
+    low = date_from.isoformat() if date_from else None
+    high = date_to.isoformat() if date_to else None
+    seen = set()
+    matches = []
+    for path in _archive_files(date_from, date_to):
+        for row in _read_archive(path):
+            if row["id"] in seen:
+                continue
+            if recipient and not (
+                recipient in row["recipient_name"].lower()
+                or recipient in row["recipient_email"].lower()
+            ):
+                continue
+            if subject and subject not in (row["subject"] or "").lower():
+                continue
+            if status and row["status"] != status:
+                continue
+            if low and row["created_at"] < low:
+                continue
+            if high and row["created_at"] > high:
+                continue
+            seen.add(row["id"])
+            matches.append(row)
+    matches.sort(key=lambda row: row["created_at"], reverse=True)
+    return matches
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Email history maintenance")
+    parser.add_argument(
+        "--convert-vacuum",
+        action="store_true",
+        help="switch the database to incremental auto-vacuum (full VACUUM; "
+        "stop the app first)",
+    )
+    parser.add_argument(
+        "--archive-days",
+        type=int,
+        help="archive history older than this many days now",
+    )
+    args = parser.parse_args()
+    if args.convert_vacuum:
+        convert_to_incremental_vacuum()
+    if args.archive_days:
+        with SessionLocal() as db:
+            archive_history(db, args.archive_days)
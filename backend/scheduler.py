@@ -0,0 +1,382 @@
+import asyncio
+import json
+import os
+import time
+from datetime import datetime, timedelta
+from typing import Dict, List, Optional
+
+from fastapi.concurrency import run_in_threadpool
+from sqlalchemy import insert, update
+from sqlalchemy.orm import Session
+
+from bundles import safe_bundle_name
+from config import get_config
+from coordination import acquire_lease
+from db import ScheduledCampaign, ScheduledMessage, SessionLocal
+from logger_config import setup_logger
+from schemas import ScheduledCampaignRequest
+from send_service import Campaign
+from templating import compile_template
+
+logger = setup_logger("scheduler")
+
+TICK_SECONDS = 1.0
+# Only the worker holding this lease dispatches; it renews it every tick
+LEASE_NAME = "campaign-dispatcher"
+LEASE_TTL = timedelta(seconds=30)
+# A long tick renews the lease this often so it never lapses mid-send
+LEASE_RENEW_SECONDS = 10
+# Campaigns without a rate send at most this many messages per tick
+MAX_PER_TICK = 50
+# SMTP sessions idle this long are closed before the server drops them
+IDLE_CLOSE_SECONDS = 30
+# Messages claimed this long ago by a dispatcher that went away
+STALE_CLAIM = timedelta(minutes=15)
+
+
+def _local_naive(value: datetime) -> datetime:
+    """Convert to the naive local time the database stores."""
+    if value.tzinfo is not None:
+        return value.astimezone().replace(tzinfo=None)
+    return value
+
+
+def schedule_campaign(
+    db: Session, request: ScheduledCampaignRequest
+) -> ScheduledCampaign:
+    """Store a campaign with one send slot per recipient.
+
+    Slots are spaced ``60 / rate_per_minute`` seconds apart from
+    ``start_at``, so the dispatcher only has to release rows whose slot
+    has passed. Raises TemplateError for invalid templates.
+    """
+    compile_template(request.subject)
+    compile_template(request.body)
+
+    start_at = _local_naive(request.start_at or datetime.now())
+    total = len(request.recipients)
+    rate = request.rate_per_minute
+    if rate is None and request.window_minutes:
+        rate = total / request.window_minutes
+    campaign = ScheduledCampaign(
+        subject=request.subject,
+        body=request.body,
+        bundle_name=(
+            safe_bundle_name(request.bundle_name) if request.bundle else None
+        ),
+        start_at=start_at,
+        rate_per_minute=rate,
+        total=total,
+        # With no messages the dispatcher would never touch it to finish it
+        status="scheduled" if total else "done",
+    )
+    db.add(campaign)
+    db.flush()
+
+    interval = 60.0 / rate if rate else 0.0
+    if request.recipients:
+        db.execute(
+            insert(ScheduledMessage),
+            [
+                {
+                    "campaign_id": campaign.id,
+                    "receiver_email": recipient.receiver_email,
+                    "recipient_name": recipient.recipient_name or "",
+                    "files": json.dumps(recipient.files),
+                    "scheduled_at": start_at + timedelta(seconds=i * interval),
+                    "status": "pending",
+                }
+                for i, recipient in enumerate(request.recipients)
+            ],
+        )
+    db.commit()
+    logger.info(
+        f"Scheduled campaign {campaign.id}: {total} messages from {start_at}"
+        f" at {rate or 'unlimited'} per minute"
+    )
+    return campaign
+
+
+def cancel_campaign(db: Session, campaign_id: int) -> Optional[ScheduledCampaign]:
+    """Cancel the campaign's messages that have not been sent yet."""
+    campaign = db.get(ScheduledCampaign, campaign_id)
+    if campaign is None:
+        return None
+    db.execute(
+        update(ScheduledMessage)
+        .where(
+            ScheduledMessage.campaign_id == campaign_id,
+            ScheduledMessage.status == "pending",
+        )
+        .values(status="cancelled")
+    )
+    if campaign.status in ("scheduled", "running"):
+        campaign.status = "cancelled"
+    db.commit()
+    return campaign
+
+
+class Dispatcher:
+    """Releases due scheduled messages at each campaign's rate.
+
+    Runs as a task started in the app lifespan. Each tick is one indexed
+    range query for due messages; a token bucket per campaign keeps a
+    backlog (e.g. after downtime) draining at the configured rate instead
+    of in a burst. SMTP sessions stay open between ticks.
+    """
+
+    def __init__(self):
+        self._stop = asyncio.Event()
+        self._task: Optional[asyncio.Task] = None
+        self._campaigns: Dict[int, Campaign] = {}
+        self._last_used: Dict[int, float] = {}
+        self._tokens: Dict[int, float] = {}
+        self._refilled: Dict[int, float] = {}
+        self._renewed = 0.0
+
+    def start(self) -> None:
+        self._task = asyncio.create_task(self._run())
+
+    async def stop(self) -> None:
+        self._stop.set()
+        if self._task is not None:
+            await self._task
+
+    async def _run(self) -> None:
+        while not self._stop.is_set():
+            try:
+                await run_in_threadpool(self.tick)
+            except Exception as e:
+                logger.error(
+                    f"Error dispatching campaigns: {str(e)}", exc_info=True
+                )
+            try:
+                await asyncio.wait_for(self._stop.wait(), TICK_SECONDS)
+            except asyncio.TimeoutError:
+                pass
+        await run_in_threadpool(self.close)
+
+    def close(self) -> None:
+        for campaign_id in list(self._campaigns):
+            self._release(campaign_id)
+
+    def _release(self, campaign_id: int) -> None:
+        campaign = self._campaigns.pop(campaign_id, None)
+        if campaign is not None:
+            campaign.close()
+        for state in (self._last_used, self._tokens, self._refilled):
+            state.pop(campaign_id, None)
+
+    def tick(self) -> None:
+        now = datetime.now()
+        with SessionLocal() as db:
+            work = (
+                db.query(ScheduledMessage.id)
+                .filter(
+                    (ScheduledMessage.status == "sending")
+                    | (
+                        (ScheduledMessage.status == "pending")
+                        & (ScheduledMessage.scheduled_at <= now)
+                    )
+                )
+                .first()
+            )
+            if work is None:
+                self._close_idle()
+                return
+            if not self._hold_lease(force=True):
+                # Another worker is dispatching
+                self.close()
+                return
+
+            self._fail_stale_claims(db, now)
+            due = (
+                db.query(ScheduledMessage.campaign_id)
+                .filter(
+                    ScheduledMessage.status == "pending",
+                    ScheduledMessage.scheduled_at <= now,
+                )
+                .distinct()
+                .all()
+            )
+            for (campaign_id,) in due:
+                if not self._dispatch(db, campaign_id, now):
+                    break
+        self._close_idle()
+
+    def _hold_lease(self, force: bool = False) -> bool:
+        """Take or renew the dispatcher lease; False if another worker has it."""
+        now = time.monotonic()
+        if not force and now - self._renewed < LEASE_RENEW_SECONDS:
+            return True
+        if not acquire_lease(LEASE_NAME, LEASE_TTL):
+            return False
+        self._renewed = now
+        return True
+
+    def _allowance(self, scheduled: ScheduledCampaign) -> int:
+        """Messages the campaign may send now, from its token bucket."""
+        if not scheduled.rate_per_minute:
+            return MAX_PER_TICK
+        now = time.monotonic()
+        per_second = scheduled.rate_per_minute / 60
+        burst = max(1.0, per_second * TICK_SECONDS)
+        last = self._refilled.get(scheduled.id)
+        tokens = self._tokens.get(scheduled.id, 1.0)
+        if last is not None:
+            tokens = min(burst, tokens + (now - last) * per_second)
+        self._tokens[scheduled.id] = tokens
+        self._refilled[scheduled.id] = now
+        return min(int(tokens), MAX_PER_TICK)
+
+    def _campaign(self, scheduled: ScheduledCampaign) -> Campaign:
+        if scheduled.id not in self._campaigns:
+            self._campaigns[scheduled.id] = Campaign(
+                get_config(),
+                scheduled.subject,
+                scheduled.body,
+                bundle_name=scheduled.bundle_name,
+            )
+        self._last_used[scheduled.id] = time.monotonic()
+        return self._campaigns[scheduled.id]
+
+    def _claim(
+        self, db: Session, campaign_id: int, now: datetime, limit: int
+    ) -> List[ScheduledMessage]:
+        """Mark up to ``limit`` due messages as sending and return them.
+
+        The update only takes rows that are still pending, so a message
+        another dispatcher claimed in the meantime is never sent twice.
+        """
+        due = (
+            db.query(ScheduledMessage.id)
+            .filter(
+                ScheduledMessage.campaign_id == campaign_id,
+                ScheduledMessage.status == "pending",
+                ScheduledMessage.scheduled_at <= now,
+            )
+            .order_by(ScheduledMessage.scheduled_at)
+            .limit(limit)
+        )
+        claimed = db.execute(
+            update(ScheduledMessage)
+            .where(
+                ScheduledMessage.id.in_([row.id for row in due]),
+                ScheduledMessage.status == "pending",
+            )
+            .values(status="sending", claimed_at=now)
+            .returning(ScheduledMessage.id)
+        ).scalars().all()
+        db.commit()
+        if not claimed:
+            return []
+        return (
+            db.query(ScheduledMessage)
+            .filter(ScheduledMessage.id.in_(claimed))
+            .order_by(ScheduledMessage.scheduled_at)
+            .all()
+        )
+
+    def _unclaim(self, db: Session, messages: List[ScheduledMessage]) -> None:
+        """Return claimed but unsent messages to the queue."""
+        for message in messages:
+            if message.status == "sending":
+                message.status = "pending"
+                message.claimed_at = None
+        db.commit()
+
+    def _dispatch(self, db: Session, campaign_id: int, now: datetime) -> bool:
+        """Send the campaign's due messages; False once the lease is lost."""
+        scheduled = db.get(ScheduledCampaign, campaign_id)
+        limit = self._allowance(scheduled)
+        if not limit:
+            return True
+        messages = self._claim(db, campaign_id, now, limit)
+        if scheduled.status == "scheduled" and messages:
+            scheduled.status = "running"
+            db.commit()
+        if scheduled.rate_per_minute:
+            self._tokens[campaign_id] -= len(messages)
+
+        campaign = self._campaign(scheduled)
+        for i, message in enumerate(messages):
+            if not self._hold_lease():
+                logger.warning("Lost the dispatcher lease, stopping this tick")
+                self._unclaim(db, messages[i:])
+                return False
+            files = json.loads(message.files)
+            missing = [f["path"] for f in files if not os.path.exists(f["path"])]
+            if missing:
+                result = {
+                    "success": False,
+                    "message": f"File not found: {missing[0]}",
+                }
+            else:
+                result = campaign.send(
+                    db,
+                    receiver_email=message.receiver_email,
+                    recipient_name=message.recipient_name,
+                    files=files,
+                )
+            message.status = "sent" if result["success"] else "failed"
+            message.message = result["message"]
+            if result["success"]:
+                scheduled.sent += 1
+            else:
+                scheduled.failed += 1
+            db.commit()
+        self._finish_if_done(db, scheduled)
+        return True
+
+    def _finish_if_done(self, db: Session, scheduled: ScheduledCampaign) -> None:
+        remaining = (
+            db.query(ScheduledMessage.id)
+            .filter(
+                ScheduledMessage.campaign_id == scheduled.id,
+                ScheduledMessage.status.in_(("pending", "sending")),
+            )
+            .first()
+        )
+        if remaining is None:
+            if scheduled.status == "running":
+                scheduled.status = "done"
+            db.commit()
+            self._release(scheduled.id)
+            logger.info(
+                f"Campaign {scheduled.id} finished: {scheduled.sent} sent, "
+                f"{scheduled.failed} failed"
+            )
+
+    def _fail_stale_claims(self, db: Session, now: datetime) -> None:
+        """Fail messages a vanished dispatcher claimed but never finished.
+
+        They may or may not have gone out, so they are not retried, which
+        would risk a duplicate.
+        """
+        stale = (
+            db.query(ScheduledMessage)
+            .filter(
+                ScheduledMessage.status == "sending",
+                ScheduledMessage.claimed_at < now - STALE_CLAIM,
+            )
+            .all()
+        )
+        for message in stale:
+            message.status = "failed"
+            message.message = "Interrupted while sending; not retried"
+            db.get(ScheduledCampaign, message.campaign_id).failed += 1
+        if stale:
+            db.commit()
+            logger.warning(
+                f"Marked {len(stale)} interrupted scheduled messages failed"
+            )
+            for campaign_id in {m.campaign_id for m in stale}:
+                self._finish_if_done(db, db.get(ScheduledCampaign, campaign_id))
+
+    def _close_idle(self) -> None:
+        """Close SMTP sessions of campaigns with nothing due for a while."""
+        cutoff = time.monotonic() - IDLE_CLOSE_SECONDS
+        for campaign_id, last_used in list(self._last_used.items()):
+            if last_used < cutoff:
+                self._campaigns.pop(campaign_id).close()
+                self._last_used.pop(campaign_id)
@@ -1,7 +1,7 @@
 from datetime import datetime
 from typing import List, Optional
 
-from pydantic import BaseModel, EmailStr
+from pydantic import BaseModel, EmailStr, Field
 
 
 class AddressBase(BaseModel):
@@ -29,6 +29,41 @@ class EmailRequest(BaseModel):
     body: str
     recipient_name: Optional[str] = ""
     files: Optional[List[dict]] = []
+    # Send several matched files as one ZIP attachment
+    bundle: Optional[bool] = False
+    bundle_name: Optional[str] = None
+
+
+class BatchRecipient(BaseModel):
+    receiver_email: EmailStr
+    recipient_name: Optional[str] = ""
+    files: Optional[List[dict]] = []
+
+
+class BatchEmailRequest(BaseModel):
+    """One subject/body template sent to many recipients.
+
+    ``subject`` and ``body`` may use ``{{ name }}``, ``{{ email }}``,
+    ``{{ files }}`` and ``{{ file_count }}`` placeholders.
+    """
+
+    subject: str
+    body: str
+    recipients: List[BatchRecipient]
+    bundle: Optional[bool] = False
+    bundle_name: Optional[str] = None
+
+
+class ScheduledCampaignRequest(BatchEmailRequest):
+    """A batch send released over time instead of all at once.
+
+    Sending starts at ``start_at`` (immediately if omitted) and is spread
+    either at ``rate_per_minute`` or evenly over ``window_minutes``.
+    """
+
+    start_at: Optional[datetime] = None
+    rate_per_minute: Optional[float] = Field(None, gt=0)
+    window_minutes: Optional[float] = Field(None, gt=0)
 
 
 class EmailResponse(BaseModel):
@@ -0,0 +1,273 @@
+import json
+import zipfile
+from datetime import datetime
+from typing import Dict, List, Optional
+
+from sqlalchemy.orm import Session
+
+import profiling
+import stats
+import suppression
+from bundles import build_bundle
+from config import Config
+from db import Address, EmailHistory
+from email_sender import EmailSender
+from logger_config import setup_logger
+from sender_pool import (
+    SenderAccount,
+    classify_failure,
+    failure_code,
+    failure_reply,
+    get_sender_pool,
+)
+from smtp_client import PipeliningSMTP
+from templating import compile_template, recipient_context
+
+logger = setup_logger("send_service")
+
+# Many providers cap messages per SMTP session; reconnect before that
+MAX_MESSAGES_PER_CONNECTION = 100
+
+
+def record_history(
+    db: Session,
+    recipient_name: str,
+    recipient_email: str,
+    subject: str,
+    file_names: List[str],
+    success: bool,
+    message: str,
+    bytes_sent: int = 0,
+    failure_reason: Optional[str] = None,
+) -> EmailHistory:
+    """Store one send attempt and count it in the statistics rollup."""
+    now = datetime.now()
+    status = "success" if success else "error"
+    history = EmailHistory(
+        recipient_name=recipient_name,
+        recipient_email=recipient_email,
+        subject=subject,
+        files=json.dumps(file_names),
+        status=status,
+        message=message,
+        created_at=now,
+    )
+    db.add(history)
+    stats.count_send(
+        db,
+        now.date(),
+        status,
+        bytes_sent=bytes_sent,
+        reason=None if success else failure_reason or "error",
+    )
+    db.commit()
+    return history
+
+
+def is_inactive(db: Session, email: str) -> bool:
+    recipient = db.query(Address).filter(Address.email == email).first()
+    return bool(recipient and recipient.status == "inactive")
+
+
+class Campaign:
+    """One subject/body sent to one or more recipients.
+
+    Templates are compiled once, attachment MIME parts are encoded once per
+    file, and an SMTP session per sender account is reused across
+    recipients. Each message is assigned an account by the sender pool and
+    moves on to another account if the first one fails authentication or
+    hits a quota. With ``bundle_name`` set, recipients with several files
+    get one ZIP instead. With ``strict_templates`` false, unknown
+    placeholders are sent as written instead of raising TemplateError.
+    """
+
+    def __init__(
+        self,
+        config: Config,
+        subject: str,
+        body: str,
+        bundle_name: Optional[str] = None,
+        strict_templates: bool = True,
+    ):
+        self.subject_template = compile_template(subject, strict_templates)
+        self.body_template = compile_template(body, strict_templates)
+        self.bundle_name = bundle_name
+        self.pool = get_sender_pool(config)
+        self._parts: Dict = {}
+        self._senders: Dict[str, EmailSender] = {}
+        self._servers: Dict[str, PipeliningSMTP] = {}
+        self._sent_on_server: Dict[str, int] = {}
+
+    def __enter__(self) -> "Campaign":
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        self.close()
+
+    def close(self) -> None:
+        for name in list(self._servers):
+            self._disconnect(name)
+
+    def _disconnect(self, name: str) -> None:
+        server = self._servers.pop(name, None)
+        if server is not None:
+            try:
+                server.quit()
+            except Exception:
+                server.close()
+
+    def _sender(self, account: SenderAccount) -> EmailSender:
+        if account.name not in self._senders:
+            self._senders[account.name] = EmailSender(account.smtp_settings())
+        return self._senders[account.name]
+
+    def _session(self, account: SenderAccount) -> PipeliningSMTP:
+        """Return a live SMTP session for ``account``, reconnecting when needed."""
+        server = self._servers.get(account.name)
+        stale = server is None or server.sock is None
+        sent = self._sent_on_server.get(account.name, 0)
+        if not stale and sent >= MAX_MESSAGES_PER_CONNECTION:
+            self._disconnect(account.name)
+            stale = True
+        if stale:
+            server = self._sender(account).connect()
+            self._servers[account.name] = server
+            self._sent_on_server[account.name] = 0
+        return server
+
+    def render(self, name: str, email: str, file_names: List[str]):
+        """Return the subject and body for one recipient."""
+        context = recipient_context(name, email, file_names)
+        return (
+            self.subject_template.render(context),
+            self.body_template.render(context),
+        )
+
+    def _attachment_paths(self, paths: List[str]):
+        """Return the paths to attach and the bundle used, if any."""
+        if not self.bundle_name or len(paths) < 2:
+            return paths, None
+        try:
+            with profiling.phase("file_io"):
+                bundle = build_bundle(paths, self.bundle_name)
+        except (OSError, zipfile.BadZipFile) as e:
+            logger.error(f"Error bundling attachments, sending separately: {str(e)}")
+            return paths, None
+        return [bundle.path], bundle
+
+    def send(
+        self,
+        db: Session,
+        receiver_email: str,
+        recipient_name: str,
+        files: List[dict],
+    ) -> Dict:
+        """Send to one recipient and record the attempt in the history.
+
+        ``files`` are the request's ``{"name", "path"}`` dicts and must
+        already have been checked to exist.
+        """
+        if suppression.is_suppressed(db, receiver_email):
+            return {
+                "success": False,
+                "message": f"Email not sent: {receiver_email} is on the "
+                "suppression list",
+            }
+        if is_inactive(db, receiver_email):
+            return {
+                "success": False,
+                "message": f"Email not sent: {receiver_email} is marked as inactive",
+            }
+
+        file_names = [f["name"] for f in files]
+        subject, body = self.render(recipient_name, receiver_email, file_names)
+        paths, bundle = self._attachment_paths([f["path"] for f in files])
+        result = self._send_with_failover(db, receiver_email, subject, body, paths)
+        if bundle and result["success"]:
+            result["bytes_saved"] = bundle.bytes_saved
+        suppression.record_result(db, receiver_email, result)
+
+        record_history(
+            db,
+            recipient_name,
+            receiver_email,
+            subject,
+            file_names,
+            result["success"],
+            result["message"],
+            bytes_sent=result.get("bytes_sent", 0),
+            failure_reason=(
+                None if result["success"] else stats.failure_reason(result)
+            ),
+        )
+        if not result["success"]:
+            logger.error(f"Email sending failed: {result['message']}")
+        return result
+
+    def _send_with_failover(
+        self, db: Session, receiver_email: str, subject: str, body: str, paths
+    ) -> Dict:
+        """Send through pool accounts until one takes the message."""
+        result = {
+            "success": False,
+            "message": f"Email not sent to {receiver_email}: "
+            "all sender accounts are over quota or disabled",
+        }
+        for _ in range(len(self.pool.accounts)):
+            account = self.pool.reserve(db)
+            if account is None:
+                break
+            result = self._send_via(account, receiver_email, subject, body, paths)
+            failure = classify_failure(
+                result.get("smtp_code"),
+                result.get("smtp_reply", ""),
+                result.get("smtp_stage"),
+            )
+            if result["success"] or failure is None:
+                break
+            self.pool.release(db, account)
+            self._disconnect(account.name)
+            if not self.pool.can_fail_over:
+                break
+            self.pool.disable(db, account, failure, result["message"])
+            logger.warning(
+                f"Sender account {account.name} failed ({failure}), "
+                f"retrying {receiver_email} on another account"
+            )
+        return result
+
+    def _send_via(
+        self,
+        account: SenderAccount,
+        receiver_email: str,
+        subject: str,
+        body: str,
+        paths,
+    ) -> Dict:
+        try:
+            with profiling.phase("smtp"):
+                server = self._session(account)
+        except Exception as e:
+            result = {
+                "success": False,
+                "message": f"Failed to send email to {receiver_email}: {str(e)}",
+                "smtp_code": failure_code(e),
+                "smtp_reply": failure_reply(e),
+            }
+            logger.error(result["message"])
+            return result
+        with profiling.phase("smtp"):
+            result = self._sender(account).send_email(
+                receiver_email=receiver_email,
+                subject=subject,
+                body=body,
+                files=paths,
+                server=server,
+                parts=self._parts,
+                shared_body=self.body_template.is_static,
+            )
+        self._sent_on_server[account.name] += 1
+        if not result["success"] and not result.get("smtp_code"):
+            # Not a clean server reply: the session may be mid-message
+            self._disconnect(account.name)
+        return result
@@ -0,0 +1,287 @@
+import json
+import re
+import smtplib
+from dataclasses import dataclass
+from datetime import datetime, timedelta
+from functools import lru_cache
+from typing import Dict, List, Optional
+
+from sqlalchemy import DateTime, bindparam, text
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from sqlalchemy.orm import Session
+
+from config import Config
+from db import SenderAccountUsage
+from logger_config import setup_logger
+
+logger = setup_logger("sender_pool")
+
+AUTH_FAILURE = "auth"
+QUOTA_FAILURE = "quota"
+AUTH_CODES = {530, 534, 535}
+THROTTLE_CODES = {421, 452, 454}
+_QUOTA_TEXT = re.compile(r"\b(quota|limit|rate|too many)", re.IGNORECASE)
+# How long an account sits out after an auth failure
+AUTH_BACKOFF = timedelta(minutes=15)
+
+# Counts a send against an account only while it has quota left; a single
+# statement so concurrent workers cannot both take the last slot.
+_RESERVE_SQL = text(
+    """
+    UPDATE sender_account_usage SET
+        hour_count = CASE WHEN hour_window = :hour THEN hour_count + 1 ELSE 1 END,
+        hour_window = :hour,
+        day_count = CASE WHEN day_window = :day THEN day_count + 1 ELSE 1 END,
+        day_window = :day
+    WHERE account = :account
+        AND (disabled_until IS NULL OR disabled_until <= :now)
+        AND (:hourly IS NULL OR hour_window != :hour OR hour_count < :hourly)
+        AND (:daily IS NULL OR day_window != :day OR day_count < :daily)
+    """
+).bindparams(bindparam("now", type_=DateTime))
+
+
+@dataclass
+class SenderAccount:
+    name: str
+    smtp_server: Optional[str]
+    port: int
+    sender_email: Optional[str]
+    password: Optional[str]
+    starttls: bool = True
+    weight: float = 1.0
+    hourly_quota: Optional[int] = None
+    daily_quota: Optional[int] = None
+    dkim_key_file: Optional[str] = None
+    dkim_selector: Optional[str] = None
+    dkim_domain: Optional[str] = None
+
+    def smtp_settings(self) -> Dict:
+        """EmailSender settings for this account."""
+        return {
+            "smtp_server": self.smtp_server,
+            "port": self.port,
+            "sender_email": self.sender_email,
+            "password": self.password,
+            "starttls": self.starttls,
+            "dkim_key_file": self.dkim_key_file,
+            "dkim_selector": self.dkim_selector,
+            "dkim_domain": self.dkim_domain,
+        }
+
+
+def classify_failure(
+    code: Optional[int], reply: str = "", stage: Optional[str] = None
+) -> Optional[str]:
+    """Tell account-level failures (worth failing over) from the rest.
+
+    ``reply`` is the server's reply text, never our own message, which
+    also names the recipient. RCPT replies are about the recipient (a
+    full mailbox, too many recipients), so they never count against the
+    account. Neither does 552 (message too big) elsewhere.
+    """
+    if stage == "rcpt":
+        return None
+    if code in AUTH_CODES:
+        return AUTH_FAILURE
+    if code in THROTTLE_CODES or (
+        code and code != 552 and _QUOTA_TEXT.search(reply)
+    ):
+        return QUOTA_FAILURE
+    return None
+
+
+def failure_code(error: Exception) -> Optional[int]:
+    """SMTP reply code carried by an exception raised while connecting."""
+    if isinstance(error, smtplib.SMTPResponseException):
+        return error.smtp_code
+    return None
+
+
+def failure_reply(error: Exception) -> str:
+    """Server reply text carried by an SMTP exception, if any."""
+    reply = getattr(error, "smtp_error", b"")
+    if isinstance(reply, bytes):
+        return reply.decode(errors="ignore")
+    return str(reply)
+
+
+def _windows(now: datetime):
+    return now.strftime("%Y-%m-%d %H"), now.strftime("%Y-%m-%d")
+
+
+class SenderPool:
+    """Weighted set of sender accounts with quotas persisted in the DB.
+
+    Each send reserves a slot on the account with the least use relative to
+    its weight, so traffic spreads in proportion to the weights while
+    accounts at their hourly or daily quota, or recently failing, are
+    skipped until their window rolls over.
+    """
+
+    def __init__(self, accounts: List[SenderAccount]):
+        self.accounts = {account.name: account for account in accounts}
+
+    @property
+    def can_fail_over(self) -> bool:
+        return len(self.accounts) > 1
+
+    def _usage(self, db: Session) -> Dict[str, SenderAccountUsage]:
+        rows = {
+            row.account: row
+            for row in db.query(SenderAccountUsage).filter(
+                SenderAccountUsage.account.in_(self.accounts)
+            )
+        }
+        missing = [name for name in self.accounts if name not in rows]
+        if missing:
+            # Concurrent first sends may create the same rows
+            db.execute(
+                sqlite_insert(SenderAccountUsage)
+                .values([{"account": name} for name in missing])
+                .on_conflict_do_nothing()
+            )
+            db.commit()
+            return self._usage(db)
+        return rows
+
+    def reserve(self, db: Session) -> Optional[SenderAccount]:
+        """Count one send against the best available account."""
+        now = datetime.now()
+        hour, day = _windows(now)
+
+        def load(row: SenderAccountUsage) -> float:
+            account = self.accounts[row.account]
+            day_count = row.day_count if row.day_window == day else 0
+            hour_count = row.hour_count if row.hour_window == hour else 0
+            return (day_count + hour_count) / account.weight
+
+        usage = self._usage(db)
+        for row in sorted(usage.values(), key=load):
+            account = self.accounts[row.account]
+            result = db.execute(
+                _RESERVE_SQL,
+                {
+                    "account": account.name,
+                    "hour": hour,
+                    "day": day,
+                    "now": now,
+                    "hourly": account.hourly_quota,
+                    "daily": account.daily_quota,
+                },
+            )
+            db.commit()
+            if result.rowcount == 1:
+                return account
+        return None
+
+    def release(self, db: Session, account: SenderAccount) -> None:
+        """Give back a reservation whose message was not sent."""
+        hour, day = _windows(datetime.now())
+        db.execute(
+            text(
+                """
+                UPDATE sender_account_usage SET
+                    hour_count = MAX(hour_count - (hour_window = :hour), 0),
+                    day_count = MAX(day_count - (day_window = :day), 0)
+                WHERE account = :account
+                """
+            ),
+            {"account": account.name, "hour": hour, "day": day},
+        )
+        db.commit()
+
+    def disable(
+        self, db: Session, account: SenderAccount, failure: str, message: str
+    ) -> None:
+        """Take an account out of rotation after an auth or quota failure."""
+        now = datetime.now()
+        if failure == AUTH_FAILURE:
+            until = now + AUTH_BACKOFF
+        else:
+            # Quota errors last until the next hourly window at least
+            until = now.replace(minute=0, second=0, microsecond=0) + timedelta(
+                hours=1
+            )
+        row = db.get(SenderAccountUsage, account.name)
+        row.disabled_until = until
+        row.last_error = message
+        db.commit()
+        logger.warning(
+            f"Sender account {account.name} disabled until {until}: {message}"
+        )
+
+    def status(self, db: Session) -> List[Dict]:
+        hour, day = _windows(datetime.now())
+        return [
+            {
+                "account": row.account,
+                "sender_email": self.accounts[row.account].sender_email,
+                "hour_count": row.hour_count if row.hour_window == hour else 0,
+                "hourly_quota": self.accounts[row.account].hourly_quota,
+                "day_count": row.day_count if row.day_window == day else 0,
+                "daily_quota": self.accounts[row.account].daily_quota,
+                "disabled_until": (
+                    row.disabled_until.isoformat() if row.disabled_until else None
+                ),
+                "last_error": row.last_error,
+            }
+            for row in self._usage(db).values()
+        ]
+
+
+def load_accounts(config: Config) -> List[SenderAccount]:
+    """Accounts from SMTP_ACCOUNTS_FILE, or the single SMTP_* account."""
+    if not config.SMTP_ACCOUNTS_FILE:
+        return [
+            SenderAccount(
+                name="default",
+                smtp_server=config.SMTP_SERVER,
+                port=config.SMTP_PORT,
+                sender_email=config.SENDER_EMAIL,
+                password=config.SMTP_PASSWORD,
+                starttls=config.SMTP_STARTTLS,
+                dkim_key_file=config.DKIM_PRIVATE_KEY_FILE,
+                dkim_selector=config.DKIM_SELECTOR,
+                dkim_domain=config.DKIM_DOMAIN,
+            )
+        ]
+
+    with open(config.SMTP_ACCOUNTS_FILE, encoding="utf-8") as f:
+        entries = json.load(f)
+    accounts = [
+        SenderAccount(
+            name=entry.get("name") or entry["sender_email"],
+            smtp_server=entry.get("smtp_server", config.SMTP_SERVER),
+            port=int(entry.get("port", config.SMTP_PORT)),
+            sender_email=entry["sender_email"],
+            password=entry["password"],
+            starttls=entry.get("starttls", config.SMTP_STARTTLS),
+            weight=float(entry.get("weight", 1.0)),
+            hourly_quota=entry.get("hourly_quota"),
+            daily_quota=entry.get("daily_quota"),
+            dkim_key_file=entry.get(
+                "dkim_key_file", config.DKIM_PRIVATE_KEY_FILE
+            ),
+            dkim_selector=entry.get("dkim_selector", config.DKIM_SELECTOR),
+            dkim_domain=entry.get("dkim_domain", config.DKIM_DOMAIN),
+        )
+        for entry in entries
+    ]
+    if not accounts:
+        raise ValueError(f"No sender accounts in {config.SMTP_ACCOUNTS_FILE}")
+    for account in accounts:
+        # Load is use divided by weight, so a zero weight would break every send
+        if not account.weight > 0:
+            raise ValueError(
+                f"Sender account {account.name} in {config.SMTP_ACCOUNTS_FILE} "
+                f"needs a positive weight, got {account.weight:g}"
+            )
+    logger.info(f"Loaded {len(accounts)} sender accounts")
+    return accounts
+
+
+@lru_cache(maxsize=None)
+def get_sender_pool(config: Config) -> SenderPool:
+    """Return the process-wide sender pool for ``config``."""
+    return SenderPool(load_accounts(config))
@@ -0,0 +1,308 @@
+import re
+import smtplib
+import socket
+from typing import Dict, Iterable, List, Sequence, Tuple, Union
+
+from logger_config import setup_logger
+
+logger = setup_logger("smtp_client")
+
+CRLF = b"\r\n"
+_LEADING_PERIOD = re.compile(rb"(?m)^\.")
+_BARE_EOL = re.compile(rb"(?:\r\n|\n|\r(?!\n))")
+
+
+def _fix_eols(data: bytes) -> bytes:
+    """Normalize every line ending to CRLF as required on the wire."""
+    return _BARE_EOL.sub(CRLF, data)
+
+
+def _dot_stuff(data: bytes, at_line_start: bool = True) -> bytes:
+    """Escape leading periods for the DATA phase (RFC 5321 4.5.2).
+
+    ``at_line_start`` says whether ``data`` continues a line left open by
+    the previous chunk, so chunks may be split anywhere.
+    """
+    if at_line_start:
+        return _LEADING_PERIOD.sub(b"..", data)
+    newline = data.find(b"\n")
+    if newline == -1:
+        return data
+    return data[:newline + 1] + _LEADING_PERIOD.sub(b"..", data[newline + 1:])
+
+
+class BytesSource:
+    """Adapts an already serialized message to the segment interface."""
+
+    def __init__(self, data: bytes):
+        self.segments = [data]
+        self.size = len(data)
+
+
+class PipeliningSMTP(smtplib.SMTP):
+    """SMTP client that uses ESMTP PIPELINING and CHUNKING when offered.
+
+    ``sendmail`` (and therefore ``send_message``) writes MAIL FROM and every
+    RCPT TO in a single batch when the server advertises PIPELINING, and
+    streams the body with BDAT when it advertises CHUNKING, so the body is
+    sent as binary chunks without dot-stuffing. Servers that offer neither
+    extension fall back to the stock ``smtplib`` conversation.
+
+    Besides ``str``/``bytes``, ``msg`` may be a streaming source: an object
+    with a total ``size`` and a list of ``segments``. A segment is either
+    ``bytes`` or an object with ``size`` and ``iter_chunks(chunk_size)``;
+    segments that also have a ``path`` and exceed ``chunk_size`` are sent
+    with ``socket.sendfile``, and ``dot_safe`` segments (such as base64)
+    skip dot-stuffing.
+    """
+
+    chunk_size = 64 * 1024
+
+    def __init__(self, *args, **kwargs):
+        self._buffer = bytearray()
+        super().__init__(*args, **kwargs)
+
+    def _get_socket(self, host, port, timeout):
+        # Commands and body pieces are written as soon as they are ready and
+        # replies awaited right after, which Nagle's algorithm would stall on
+        # the peer's delayed ACK
+        sock = super()._get_socket(host, port, timeout)
+        sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        return sock
+
+    def sendmail(
+        self,
+        from_addr: str,
+        to_addrs: Union[str, Sequence[str]],
+        msg,
+        mail_options: Sequence[str] = (),
+        rcpt_options: Sequence[str] = (),
+    ) -> Dict[str, Tuple[int, bytes]]:
+        self.ehlo_or_helo_if_needed()
+        pipelining = self.has_extn("pipelining")
+        chunking = self.has_extn("chunking")
+        streaming = hasattr(msg, "segments")
+        if not (pipelining or chunking or streaming):
+            return super().sendmail(
+                from_addr, to_addrs, msg, mail_options, rcpt_options
+            )
+
+        if isinstance(to_addrs, str):
+            to_addrs = [to_addrs]
+        if not streaming:
+            if isinstance(msg, str):
+                msg = msg.encode("ascii")
+            msg = BytesSource(_fix_eols(msg))
+
+        options = list(mail_options)
+        if self.has_extn("size"):
+            options.append(f"size={msg.size}")
+        if chunking and self.has_extn("binarymime"):
+            options.append("BODY=BINARYMIME")
+
+        logger.debug(
+            f"Sending via pipelining={pipelining}, chunking={chunking}"
+        )
+        if pipelining:
+            sender_reply, rcpt_replies, data_reply = self._pipeline_envelope(
+                from_addr, to_addrs, options, rcpt_options, not chunking
+            )
+        else:
+            sender_reply = self.mail(from_addr, options)
+            rcpt_replies = [
+                self.rcpt(addr, rcpt_options) if sender_reply[0] == 250
+                else None
+                for addr in to_addrs
+            ]
+            data_reply = None
+            if not chunking and any(
+                reply and reply[0] in (250, 251) for reply in rcpt_replies
+            ):
+                self.putcmd("data")
+                data_reply = self.getreply()
+
+        refused = self._check_envelope(
+            from_addr, to_addrs, sender_reply, rcpt_replies, data_reply
+        )
+
+        self._buffer.clear()
+        try:
+            if chunking:
+                code, resp = self._bdat(msg.segments, pipelining)
+            else:
+                code, resp = self._finish_data(msg.segments)
+        except Exception as e:
+            # A body cut off midway (unreadable spool, socket timeout) leaves
+            # the server inside the message; anything sent next would be
+            # appended to it, so the session cannot be reused.
+            self.close()
+            if isinstance(e, smtplib.SMTPServerDisconnected):
+                raise
+            raise smtplib.SMTPServerDisconnected(
+                f"Connection closed after the message body failed: {e}"
+            ) from e
+        if code != 250:
+            if code == 421:
+                self.close()
+            else:
+                self._rset()
+            raise smtplib.SMTPDataError(code, resp)
+        return refused
+
+    def _pipeline_envelope(
+        self,
+        from_addr: str,
+        to_addrs: List[str],
+        mail_options: List[str],
+        rcpt_options: Sequence[str],
+        with_data: bool,
+    ):
+        """Write MAIL, RCPT (and optionally DATA) at once, then read replies."""
+        lines = [f"mail FROM:{smtplib.quoteaddr(from_addr)}"
+                 f"{self._optionlist(mail_options)}"]
+        lines.extend(
+            f"rcpt TO:{smtplib.quoteaddr(addr)}"
+            f"{self._optionlist(rcpt_options)}"
+            for addr in to_addrs
+        )
+        if with_data:
+            lines.append("data")
+        self.send("".join(line + "\r\n" for line in lines))
+
+        sender_reply = self.getreply()
+        rcpt_replies = [self.getreply() for _ in to_addrs]
+        data_reply = self.getreply() if with_data else None
+        return sender_reply, rcpt_replies, data_reply
+
+    def _check_envelope(
+        self, from_addr, to_addrs, sender_reply, rcpt_replies, data_reply
+    ) -> Dict[str, Tuple[int, bytes]]:
+        """Raise like ``smtplib.sendmail`` when the envelope was rejected."""
+        code, resp = sender_reply
+        if code != 250:
+            self._abort_data(data_reply)
+            if code == 421:
+                self.close()
+            else:
+                self._rset()
+            raise smtplib.SMTPSenderRefused(code, resp, from_addr)
+
+        refused = {
+            addr: reply
+            for addr, reply in zip(to_addrs, rcpt_replies)
+            if reply is None or reply[0] not in (250, 251)
+        }
+        if len(refused) == len(to_addrs):
+            self._abort_data(data_reply)
+            self._rset()
+            raise smtplib.SMTPRecipientsRefused(refused)
+        if data_reply is not None and data_reply[0] != 354:
+            self._rset()
+            raise smtplib.SMTPDataError(*data_reply)
+        return refused
+
+    def _abort_data(self, data_reply) -> None:
+        """Terminate a DATA phase a server opened despite a bad envelope."""
+        if data_reply is not None and data_reply[0] == 354:
+            self.send(b"." + CRLF)
+            self.getreply()
+
+    def _write(self, data: bytes) -> None:
+        """Queue ``data`` for the socket, sending once a chunk has built up.
+
+        Small pieces such as BDAT headers and the DATA terminator then share
+        a write with the neighbouring body bytes instead of going out alone.
+        """
+        self._buffer += data
+        if len(self._buffer) >= self.chunk_size:
+            self._flush()
+
+    def _flush(self) -> None:
+        if self._buffer:
+            self.send(bytes(self._buffer))
+            self._buffer.clear()
+
+    def _write_segment(self, segment) -> None:
+        """Write one non-bytes segment, zero-copy when it is a large file."""
+        path = getattr(segment, "path", None)
+        if path is not None and segment.size > self.chunk_size:
+            self._flush()
+            with open(path, "rb") as f:
+                self.sock.sendfile(f)
+            return
+        for chunk in segment.iter_chunks(self.chunk_size):
+            self._write(chunk)
+
+    def _finish_data(self, segments: Iterable) -> Tuple[int, bytes]:
+        """Send the body after DATA already got its 354."""
+        at_line_start = True
+        last = CRLF
+        for segment in segments:
+            if isinstance(segment, bytes):
+                chunks = [segment]
+            elif getattr(segment, "dot_safe", False):
+                # Base64 never starts a line with "." and ends with CRLF
+                self._write_segment(segment)
+                at_line_start, last = True, CRLF
+                continue
+            else:
+                chunks = segment.iter_chunks(self.chunk_size)
+            for chunk in chunks:
+                if not chunk:
+                    continue
+                self._write(_dot_stuff(chunk, at_line_start))
+                at_line_start = chunk.endswith(b"\n")
+                # A CRLF may be split across chunks
+                last = (last + chunk)[-2:]
+        self._write(b"." + CRLF if last == CRLF else CRLF + b"." + CRLF)
+        self._flush()
+        return self.getreply()
+
+    def _bdat(self, segments: Iterable, pipelining: bool) -> Tuple[int, bytes]:
+        """Stream the body as BDAT chunks (RFC 3030), the final one marked LAST."""
+        code, resp = 250, b""
+        pending = 0
+
+        def chunks():
+            for segment in segments:
+                if isinstance(segment, bytes):
+                    view = memoryview(segment)
+                    for offset in range(0, len(segment), self.chunk_size):
+                        yield bytes(view[offset:offset + self.chunk_size])
+                elif segment.size:
+                    yield segment
+
+        previous = None
+        for chunk in chunks():
+            if previous is not None:
+                self._bdat_chunk(previous)
+                if pipelining:
+                    pending += 1
+                else:
+                    self._flush()
+                    code, resp = self.getreply()
+                    if code != 250:
+                        return code, resp
+            previous = chunk
+        # Marking the final chunk LAST saves a separate empty BDAT
+        self._bdat_chunk(b"" if previous is None else previous, last=True)
+        self._flush()
+        pending += 1
+
+        for _ in range(pending):
+            reply = self.getreply()
+            if code == 250:
+                code, resp = reply
+        return code, resp
+
+    def _bdat_chunk(self, chunk, last: bool = False) -> None:
+        """Queue one BDAT command together with its payload."""
+        size = len(chunk) if isinstance(chunk, bytes) else chunk.size
+        self._write(b"BDAT %d%s" % (size, b" LAST" if last else b"") + CRLF)
+        if isinstance(chunk, bytes):
+            self._write(chunk)
+        else:
+            self._write_segment(chunk)
+
+    def _optionlist(self, options: Sequence[str]) -> str:
+        return " " + " ".join(options) if options and self.does_esmtp else ""
@@ -0,0 +1,126 @@
+import base64
+import hashlib
+import os
+import shutil
+import tempfile
+from pathlib import Path
+from typing import Iterable, Iterator, Optional, Tuple
+
+from logger_config import setup_logger
+
+logger = setup_logger("spool")
+
+# Pre-encoded attachments live in a hidden folder inside the upload folder,
+# which the file catalog, listing and old-file sweep all skip.
+SPOOL_DIRNAME = ".spool"
+# 57 raw bytes encode to exactly one 76-character base64 line
+LINE_BYTES = 57
+READ_BYTES = LINE_BYTES * 1024
+
+
+def spool_paths(file_path: str) -> Tuple[Path, Path]:
+    """Return the spool and checksum file locations for an upload."""
+    source = Path(file_path)
+    spool_dir = source.parent / SPOOL_DIRNAME
+    return (
+        spool_dir / f"{source.name}.b64",
+        spool_dir / f"{source.name}.sha256",
+    )
+
+
+def encoded_size(raw_size: int) -> int:
+    """Size of the CRLF line-wrapped base64 encoding of ``raw_size`` bytes."""
+    full_lines, remainder = divmod(raw_size, LINE_BYTES)
+    size = full_lines * 78
+    if remainder:
+        size += 4 * -(-remainder // 3) + 2
+    return size
+
+
+def iter_base64(file_path: str, read_bytes: int = READ_BYTES) -> Iterator[bytes]:
+    """Yield the CRLF line-wrapped base64 encoding of a file."""
+    read_bytes -= read_bytes % LINE_BYTES
+    with open(file_path, "rb") as f:
+        while True:
+            block = f.read(read_bytes)
+            if not block:
+                break
+            yield base64.encodebytes(block).replace(b"\n", b"\r\n")
+
+
+def spool_file(file_path: str) -> Optional[Path]:
+    """Write the send-ready encoding and SHA-256 checksum of one upload.
+
+    Files are written under a temporary name and renamed into place, so a
+    sender never sees a partial spool.
+    """
+    spool, checksum_path = spool_paths(file_path)
+    spool.parent.mkdir(exist_ok=True)
+    digest = hashlib.sha256()
+    tmp = None
+    try:
+        # Unique per writer, as threads may spool the same file at once
+        with open(file_path, "rb") as source, tempfile.NamedTemporaryFile(
+            dir=spool.parent, prefix=f"{spool.name}.", suffix=".tmp", delete=False
+        ) as target:
+            tmp = Path(target.name)
+            while True:
+                block = source.read(READ_BYTES)
+                if not block:
+                    break
+                digest.update(block)
+                target.write(base64.encodebytes(block).replace(b"\n", b"\r\n"))
+        os.replace(tmp, spool)
+        checksum_path.write_text(digest.hexdigest())
+    except OSError as e:
+        if tmp is not None:
+            tmp.unlink(missing_ok=True)
+        logger.error(f"Error spooling {file_path}: {str(e)}")
+        return None
+    logger.debug(f"Spooled {file_path}")
+    return spool
+
+
+def spool_files(file_paths: Iterable[str]) -> None:
+    """Background task run after uploads."""
+    for file_path in file_paths:
+        spool_file(file_path)
+
+
+def spooled(file_path: str) -> Optional[Path]:
+    """Return the spool for ``file_path`` if it is present and current."""
+    spool, _ = spool_paths(file_path)
+    try:
+        source_stat = os.stat(file_path)
+        spool_stat = os.stat(spool)
+    except FileNotFoundError:
+        return None
+    expected = encoded_size(source_stat.st_size)
+    if spool_stat.st_mtime < source_stat.st_mtime or spool_stat.st_size != expected:
+        return None
+    return spool
+
+
+def checksum(file_path: str) -> str:
+    """SHA-256 of an upload, from its spool checksum when available."""
+    spool, checksum_path = spool_paths(file_path)
+    if spooled(file_path):
+        try:
+            return checksum_path.read_text().strip()
+        except FileNotFoundError:
+            pass
+    digest = hashlib.sha256()
+    with open(file_path, "rb") as f:
+        for block in iter(lambda: f.read(READ_BYTES), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def remove_spools(file_paths: Iterable[str]) -> None:
+    for file_path in file_paths:
+        for path in spool_paths(file_path):
+            path.unlink(missing_ok=True)
+
+
+def clear_spool(upload_folder: Path) -> None:
+    shutil.rmtree(upload_folder / SPOOL_DIRNAME, ignore_errors=True)
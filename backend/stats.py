@@ -0,0 +1,145 @@
+from datetime import date, datetime
+from typing import Dict, Optional
+
+from sqlalchemy import func, text
+from sqlalchemy.orm import Session
+
+from coordination import WORKER_ID
+from db import FailureReasonStats, Lease, SendStats
+from logger_config import setup_logger
+from sender_pool import classify_failure
+
+logger = setup_logger("stats")
+
+_COUNT_SEND_SQL = text(
+    """
+    INSERT INTO send_stats (day, status, count, bytes_sent)
+    VALUES (:day, :status, 1, :bytes_sent)
+    ON CONFLICT(day, status) DO UPDATE SET
+        count = send_stats.count + 1,
+        bytes_sent = send_stats.bytes_sent + excluded.bytes_sent
+    """
+)
+
+_COUNT_FAILURE_SQL = text(
+    """
+    INSERT INTO failure_reason_stats (day, reason, count)
+    VALUES (:day, :reason, 1)
+    ON CONFLICT(day, reason) DO UPDATE SET
+        count = failure_reason_stats.count + 1
+    """
+)
+
+# Never-expiring lease row recording that backfill() has run
+BACKFILL_MARKER = "send-stats-backfilled"
+
+# History written before the rollup existed; its failures have no reason
+# and its message sizes are unknown. Days other workers already counted
+# are topped up rather than skipped, so running this again changes nothing.
+_BACKFILL_SQL = (
+    """
+    INSERT INTO send_stats (day, status, count, bytes_sent)
+    SELECT substr(created_at, 1, 10), status, count(*), 0
+    FROM email_history WHERE true GROUP BY 1, 2
+    ON CONFLICT(day, status) DO UPDATE SET
+        count = MAX(send_stats.count, excluded.count)
+    """,
+    """
+    INSERT INTO failure_reason_stats (day, reason, count)
+    SELECT history.day, 'unknown', history.count - COALESCE(sum(f.count), 0)
+    FROM (
+        SELECT substr(created_at, 1, 10) AS day, count(*) AS count
+        FROM email_history WHERE status = 'error' GROUP BY 1
+    ) AS history
+    LEFT JOIN failure_reason_stats AS f ON f.day = history.day
+    WHERE true
+    GROUP BY history.day, history.count
+    HAVING history.count > COALESCE(sum(f.count), 0)
+    ON CONFLICT(day, reason) DO UPDATE SET
+        count = failure_reason_stats.count + excluded.count
+    """,
+)
+
+
+def failure_reason(result: Dict) -> str:
+    """Short category of a failed send result, used as the rollup key."""
+    code = result.get("smtp_code")
+    if result.get("smtp_stage") == "rcpt":
+        return "recipient_refused"
+    failure = classify_failure(code, result.get("smtp_reply", ""))
+    if failure is not None:
+        return failure
+    if code:
+        return f"smtp_{code}"
+    return "error"
+
+
+def count_send(
+    db: Session,
+    day: date,
+    status: str,
+    bytes_sent: int = 0,
+    reason: Optional[str] = None,
+) -> None:
+    """Add one history row to the rollup, in the caller's transaction."""
+    db.execute(
+        _COUNT_SEND_SQL,
+        {"day": day.isoformat(), "status": status, "bytes_sent": bytes_sent},
+    )
+    if reason is not None:
+        db.execute(_COUNT_FAILURE_SQL, {"day": day.isoformat(), "reason": reason})
+
+
+def backfill(db: Session) -> bool:
+    """Fold email_history into the rollup once per database.
+
+    Completion is marked in the same transaction, instead of inferred from
+    an empty rollup, which another worker may already have counted into.
+    """
+    if db.get(Lease, BACKFILL_MARKER) is not None:
+        return False
+    for statement in _BACKFILL_SQL:
+        db.execute(text(statement))
+    db.add(Lease(name=BACKFILL_MARKER, owner=WORKER_ID, expires_at=datetime.max))
+    db.commit()
+    logger.info("Built send statistics from existing email history")
+    return True
+
+
+def summary(
+    db: Session,
+    date_from: Optional[date] = None,
+    date_to: Optional[date] = None,
+) -> Dict:
+    """Totals, per-day counters and failure reasons in a date range."""
+    sends = db.query(SendStats)
+    failures = db.query(
+        FailureReasonStats.reason, func.sum(FailureReasonStats.count)
+    )
+    if date_from:
+        sends = sends.filter(SendStats.day >= date_from.isoformat())
+        failures = failures.filter(FailureReasonStats.day >= date_from.isoformat())
+    if date_to:
+        sends = sends.filter(SendStats.day <= date_to.isoformat())
+        failures = failures.filter(FailureReasonStats.day <= date_to.isoformat())
+
+    totals: Dict = {"total": 0, "bytes_sent": 0}
+    days: Dict[str, Dict] = {}
+    for row in sends.order_by(SendStats.day):
+        day = days.setdefault(row.day, {"day": row.day, "bytes_sent": 0})
+        day[row.status] = day.get(row.status, 0) + row.count
+        day["bytes_sent"] += row.bytes_sent
+        totals[row.status] = totals.get(row.status, 0) + row.count
+        totals["total"] += row.count
+        totals["bytes_sent"] += row.bytes_sent
+
+    failures = failures.group_by(FailureReasonStats.reason).order_by(
+        func.sum(FailureReasonStats.count).desc()
+    )
+    return {
+        "totals": totals,
+        "days": list(days.values()),
+        "failure_reasons": [
+            {"reason": reason, "count": count} for reason, count in failures
+        ],
+    }
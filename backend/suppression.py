@@ -0,0 +1,138 @@
+import re
+import threading
+import time
+from typing import Dict, Optional, Set
+
+from sqlalchemy import func
+from sqlalchemy.orm import Session
+
+from config import get_config
+from db import Address, Suppression
+from logger_config import setup_logger
+from sender_pool import AUTH_CODES
+
+logger = setup_logger("suppression")
+
+HARD_BOUNCE = "hard_bounce"
+REPEATED_REFUSALS = "repeated_refusals"
+# Temporary RCPT refusals in a row before a recipient is suppressed
+REFUSAL_LIMIT = 3
+# RCPT replies about the session or sender rather than the recipient
+SESSION_CODES = AUTH_CODES | {421}
+# Permanent RCPT codes that can mean the address itself does not work
+ADDRESS_CODES = {550, 551, 553}
+# Enhanced status code (RFC 3463) opening a reply, e.g. "5.1.1"
+_ENHANCED_STATUS = re.compile(r"^\s*[245]\.(\d{1,3})\.\d{1,3}\b")
+# Seconds before the in-memory set is re-read, picking up other workers'
+# suppressions
+REFRESH_INTERVAL = 60
+
+_lock = threading.Lock()
+_emails: Set[str] = set()
+# Recipients with refusals counted but not yet suppressed
+_refused: Set[str] = set()
+_loaded_at: Optional[float] = None
+
+
+def _normalize(email: str) -> str:
+    return email.strip().lower()
+
+
+def _load(db: Session) -> Set[str]:
+    global _emails, _refused, _loaded_at
+    with _lock:
+        if _loaded_at is None or time.monotonic() - _loaded_at > REFRESH_INTERVAL:
+            rows = db.query(Suppression.email, Suppression.suppressed).all()
+            _emails = {email for email, suppressed in rows if suppressed}
+            _refused = {email for email, suppressed in rows if not suppressed}
+            _loaded_at = time.monotonic()
+        return _emails
+
+
+def is_suppressed(db: Session, email: str) -> bool:
+    """Set lookup; the database is read at most once per REFRESH_INTERVAL."""
+    return _normalize(email) in _load(db)
+
+
+def _suppress(
+    db: Session, entry: Suppression, reason: str, code: int, message: str
+) -> None:
+    entry.suppressed = True
+    entry.reason = reason
+    entry.smtp_code = code
+    entry.message = message
+    if get_config().SUPPRESSION_DEACTIVATES_ADDRESS:
+        db.query(Address).filter(
+            func.lower(Address.email) == entry.email
+        ).update({"status": "inactive"}, synchronize_session=False)
+    with _lock:
+        _emails.add(entry.email)
+        _refused.discard(entry.email)
+    logger.warning(f"Suppressed {entry.email} ({reason}, {code}): {message}")
+
+
+def is_hard_bounce(code: int, reply: str) -> bool:
+    """True when a permanent RCPT reply says the address itself is bad.
+
+    Only 550/551/553 with an address or mailbox status (5.1.x, 5.2.x) or
+    no enhanced status qualify. Policy, relay and reputation rejections
+    such as 5.7.x say nothing about the address.
+    """
+    if code not in ADDRESS_CODES:
+        return False
+    match = _ENHANCED_STATUS.match(reply)
+    return match is None or match.group(1) in ("1", "2")
+
+
+def record_result(db: Session, email: str, result: Dict) -> None:
+    """Update the suppression list from the outcome of one send.
+
+    A hard bounce (see ``is_hard_bounce``) suppresses the recipient at
+    once; any other RCPT refusal, temporary or permanent, counts towards
+    REFUSAL_LIMIT refusals in a row. Replies that point at the session or
+    sender (auth, service closing) are not held against the recipient,
+    and a successful send clears the refusal count.
+    """
+    email = _normalize(email)
+    if result["success"]:
+        _load(db)
+        if email not in _refused:
+            return
+        _refused.discard(email)
+        db.query(Suppression).filter(
+            Suppression.email == email, Suppression.suppressed.is_(False)
+        ).delete(synchronize_session=False)
+        db.commit()
+        return
+
+    code = result.get("smtp_code")
+    if result.get("smtp_stage") != "rcpt" or not code:
+        return
+    if code in SESSION_CODES:
+        return
+
+    entry = db.get(Suppression, email)
+    if entry is None:
+        entry = Suppression(email=email, refusals=0)
+        db.add(entry)
+    entry.refusals += 1
+    _refused.add(email)
+    if is_hard_bounce(code, result.get("smtp_reply", "")):
+        _suppress(db, entry, HARD_BOUNCE, code, result["message"])
+    elif entry.refusals >= REFUSAL_LIMIT:
+        _suppress(db, entry, REPEATED_REFUSALS, code, result["message"])
+    db.commit()
+
+
+def remove(db: Session, email: str) -> bool:
+    """Lift a suppression; returns False if ``email`` was not listed."""
+    deleted = (
+        db.query(Suppression)
+        .filter(Suppression.email == _normalize(email))
+        .delete(synchronize_session=False)
+    )
+    db.commit()
+    with _lock:
+        _emails.discard(_normalize(email))
+        _refused.discard(_normalize(email))
+    return bool(deleted)
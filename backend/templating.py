@@ -0,0 +1,78 @@
+import re
+from functools import lru_cache
+from typing import Dict, List, Sequence, Tuple
+
+# Values available to subject/body templates, e.g. "Hello {{ name }}"
+PLACEHOLDERS = ("name", "email", "files", "file_count")
+
+# ASCII names only, so text such as "{{ 고객명 }}" is never a placeholder
+_PLACEHOLDER = re.compile(r"\{\{\s*([A-Za-z_]\w*)\s*\}\}", re.ASCII)
+
+
+class TemplateError(ValueError):
+    """Raised when a template uses an unknown placeholder."""
+
+
+class CompiledTemplate:
+    """Subject or body template parsed once and rendered per recipient.
+
+    The source is split into literal text and placeholder names up front,
+    so rendering is a single join with no regex work. Unknown placeholders
+    raise TemplateError, or are kept as literal text when ``strict`` is
+    false.
+    """
+
+    def __init__(self, source: str, strict: bool = True):
+        self.source = source
+        self._segments: List[Tuple[bool, str]] = []
+        position = 0
+        for match in _PLACEHOLDER.finditer(source):
+            field = match.group(1)
+            if field not in PLACEHOLDERS:
+                if not strict:
+                    continue
+                raise TemplateError(
+                    f"Unknown placeholder {{{{ {field} }}}}; "
+                    f"use one of: {', '.join(PLACEHOLDERS)}"
+                )
+            if match.start() > position:
+                self._segments.append((False, source[position:match.start()]))
+            self._segments.append((True, field))
+            position = match.end()
+        if position < len(source):
+            self._segments.append((False, source[position:]))
+
+    @property
+    def is_static(self) -> bool:
+        """True when every recipient gets the same text."""
+        return not any(is_field for is_field, _ in self._segments)
+
+    def render(self, context: Dict[str, str]) -> str:
+        if self.is_static:
+            return self.source
+        return "".join(
+            context[value] if is_field else value
+            for is_field, value in self._segments
+        )
+
+
+@lru_cache(maxsize=256)
+def compile_template(source: str, strict: bool = True) -> CompiledTemplate:
+    """Compile ``source``, reusing the result for repeated templates.
+
+    The frontend sends one request per recipient with the same subject and
+    body, so the cache makes those requests share one compiled template.
+    """
+    return CompiledTemplate(source, strict)
+
+
+def recipient_context(
+    name: str, email: str, file_names: Sequence[str]
+) -> Dict[str, str]:
+    """Build the placeholder values for one recipient."""
+    return {
+        "name": name or "",
+        "email": email,
+        "files": ", ".join(file_names),
+        "file_count": str(len(file_names)),
+    }
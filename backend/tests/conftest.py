@@ -0,0 +1,41 @@
+import socket
+
+import pytest
+from sqlalchemy import create_engine
+from sqlalchemy.orm import Session
+
+from benchmarks.smtp_sink import SinkOptions, SMTPSink
+from db import Base
+
+
+def free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+@pytest.fixture
+def start_sink():
+    sinks = []
+
+    def start(**options) -> SMTPSink:
+        sink = SMTPSink(
+            SinkOptions(port=free_port(), keep_messages=True, **options)
+        )
+        sink.start_in_thread()
+        sinks.append(sink)
+        return sink
+
+    yield start
+    for sink in sinks:
+        sink.stop_thread()
+
+
+@pytest.fixture
+def db(tmp_path):
+    """Session on a fresh database with every table."""
+    engine = create_engine(f"sqlite:///{tmp_path / 'test.db'}")
+    Base.metadata.create_all(engine)
+    with Session(engine) as session:
+        yield session
+    engine.dispose()
@@ -0,0 +1,38 @@
+from datetime import datetime, timedelta
+
+from db import ScheduledMessage
+from scheduler import schedule_campaign
+from schemas import ScheduledCampaignRequest
+
+
+def request(recipients: list, **fields) -> ScheduledCampaignRequest:
+    return ScheduledCampaignRequest(
+        subject="Hello {{ name }}",
+        body="Body",
+        recipients=recipients,
+        start_at=datetime.now() + timedelta(hours=1),
+        **fields,
+    )
+
+
+def test_campaign_without_recipients_is_done(db):
+    campaign = schedule_campaign(db, request([], window_minutes=10))
+    assert campaign.status == "done"
+    assert campaign.total == 0
+    assert db.query(ScheduledMessage).count() == 0
+
+
+def test_campaign_with_recipients_is_scheduled(db):
+    recipients = [
+        {"receiver_email": f"r{i}@example.com", "recipient_name": f"R{i}"}
+        for i in range(3)
+    ]
+    campaign = schedule_campaign(db, request(recipients, rate_per_minute=60))
+    assert campaign.status == "scheduled"
+    slots = [
+        message.scheduled_at
+        for message in db.query(ScheduledMessage).order_by(ScheduledMessage.id)
+    ]
+    assert [slot - slots[0] for slot in slots] == [
+        timedelta(0), timedelta(seconds=1), timedelta(seconds=2)
+    ]
@@ -0,0 +1,96 @@
+import re
+
+import pytest
+
+from config import get_config
+from send_service import Campaign
+from sender_pool import SenderAccount, SenderPool
+
+
+def campaign_for(sink, subject: str, body: str, **fields) -> Campaign:
+    campaign = Campaign(get_config(), subject, body)
+    campaign.pool = SenderPool(
+        [
+            SenderAccount(
+                name="sink",
+                smtp_server="127.0.0.1",
+                port=sink.options.port,
+                sender_email="sender@example.com",
+                password="secret",
+                starttls=False,
+                **fields,
+            )
+        ]
+    )
+    return campaign
+
+
+def cached(campaign: Campaign, kind: str) -> list:
+    return [
+        key for key in campaign._parts
+        if isinstance(key, tuple) and key[0] == kind
+    ]
+
+
+def test_personalized_body_parts_not_cached(db, start_sink):
+    sink = start_sink()
+    with campaign_for(sink, "Hi {{ name }}", "Dear {{ name }},\nhello") as campaign:
+        for i in range(5):
+            result = campaign.send(db, f"r{i}@example.com", f"R{i}", files=[])
+            assert result["success"]
+        assert cached(campaign, "text") == []
+    assert len(sink.received) == 5
+    assert b"Dear R3," in sink.received[3][1]
+
+
+def test_static_body_part_shared(db, start_sink):
+    sink = start_sink()
+    with campaign_for(sink, "Hi {{ name }}", "Same for everyone") as campaign:
+        for i in range(5):
+            result = campaign.send(db, f"r{i}@example.com", f"R{i}", files=[])
+            assert result["success"]
+        assert len(cached(campaign, "text")) == 1
+    assert len(sink.received) == 5
+
+
+@pytest.fixture
+def dkim_key(tmp_path) -> str:
+    pytest.importorskip("cryptography")
+    from cryptography.hazmat.primitives import serialization
+    from cryptography.hazmat.primitives.asymmetric import ed25519
+
+    path = tmp_path / "dkim.pem"
+    path.write_bytes(
+        ed25519.Ed25519PrivateKey.generate().private_bytes(
+            serialization.Encoding.PEM,
+            serialization.PrivateFormat.PKCS8,
+            serialization.NoEncryption(),
+        )
+    )
+    return str(path)
+
+
+def body_hashes(sink) -> set:
+    return {
+        re.search(rb"bh=([^;]+);", message).group(1)
+        for _, message in sink.received
+    }
+
+
+@pytest.mark.parametrize(
+    "body,hashes,cached_hashes",
+    [("Dear {{ name }}", 3, 0), ("Same for everyone", 1, 1)],
+)
+def test_dkim_body_hash_cached_only_for_shared_body(
+    db, start_sink, dkim_key, body, hashes, cached_hashes
+):
+    sink = start_sink()
+    campaign = campaign_for(
+        sink, "Hi", body, dkim_key_file=dkim_key, dkim_selector="test"
+    )
+    with campaign:
+        for i in range(3):
+            result = campaign.send(db, f"r{i}@example.com", f"R{i}", files=[])
+            assert result["success"]
+        assert len(cached(campaign, "body_hash")) == cached_hashes
+    assert len(body_hashes(sink)) == hashes
@@ -0,0 +1,120 @@
+import json
+from collections import Counter
+from datetime import datetime
+
+import pytest
+from sqlalchemy import text
+from sqlalchemy.orm import Session
+
+from config import Config, get_config
+from db import SenderAccountUsage
+from send_service import Campaign
+from sender_pool import (
+    AUTH_FAILURE,
+    QUOTA_FAILURE,
+    SenderAccount,
+    SenderPool,
+    classify_failure,
+    load_accounts,
+)
+
+
+@pytest.mark.parametrize(
+    "code,reply,stage,expected",
+    [
+        (535, "5.7.8 Authentication credentials invalid", None, AUTH_FAILURE),
+        (421, "4.7.0 Try again later", None, QUOTA_FAILURE),
+        (550, "5.4.5 Daily user sending quota exceeded", None, QUOTA_FAILURE),
+        # Recipient-side replies never take an account out of rotation
+        (552, "5.2.2 Mailbox full, quota exceeded", "rcpt", None),
+        (452, "4.5.3 Too many recipients", "rcpt", None),
+        (552, "5.3.4 Message size exceeds fixed limit", None, None),
+        (550, "5.1.1 User unknown", None, None),
+        (None, "", None, None),
+    ],
+)
+def test_classify_failure(code, reply, stage, expected):
+    assert classify_failure(code, reply, stage) == expected
+
+
+
+def account(name: str, port: int = 25, **fields) -> SenderAccount:
+    return SenderAccount(
+        name=name,
+        smtp_server="127.0.0.1",
+        port=port,
+        sender_email=f"{name}@example.com",
+        password="secret",
+        **fields,
+    )
+
+
+def reserve_all(pool: SenderPool, db: Session, times: int) -> Counter:
+    reserved = (pool.reserve(db) for _ in range(times))
+    return Counter(a.name if a else None for a in reserved)
+
+
+def test_hourly_quota(db):
+    pool = SenderPool([account("a", hourly_quota=2)])
+    assert reserve_all(pool, db, 3) == {"a": 2, None: 1}
+
+    # A new hour starts the count again
+    db.execute(text("UPDATE sender_account_usage SET hour_window = 'old'"))
+    assert pool.reserve(db).name == "a"
+
+
+def test_daily_quota(db):
+    pool = SenderPool([account("a", hourly_quota=10, daily_quota=3)])
+    assert reserve_all(pool, db, 4) == {"a": 3, None: 1}
+
+    # The daily quota holds across hours until the day changes
+    db.execute(text("UPDATE sender_account_usage SET hour_window = 'old'"))
+    assert pool.reserve(db) is None
+    db.execute(text("UPDATE sender_account_usage SET day_window = 'old'"))
+    assert pool.reserve(db).name == "a"
+
+
+def test_weighted_selection(db):
+    pool = SenderPool([account("a", weight=3), account("b", weight=1)])
+    assert reserve_all(pool, db, 8) == {"a": 6, "b": 2}
+
+
+def test_full_account_skipped(db):
+    pool = SenderPool([account("a", hourly_quota=1), account("b")])
+    assert reserve_all(pool, db, 4) == {"a": 1, "b": 3}
+
+
+def test_non_positive_weight_rejected(tmp_path):
+    accounts_file = tmp_path / "accounts.json"
+    accounts_file.write_text(
+        json.dumps(
+            [
+                {"sender_email": "a@example.com", "password": "x"},
+                {"sender_email": "b@example.com", "password": "x", "weight": 0},
+            ]
+        )
+    )
+    config = Config()
+    config.SMTP_ACCOUNTS_FILE = str(accounts_file)
+    with pytest.raises(ValueError, match="b@example.com.*positive weight"):
+        load_accounts(config)
+
+
+def test_auth_failure_fails_over(db, start_sink):
+    sink = start_sink(reject_logins=["broken@example.com"])
+    accounts = [
+        account("broken", port=sink.options.port, starttls=False, weight=2),
+        account("working", port=sink.options.port, starttls=False),
+    ]
+    with Campaign(get_config(), "Hello", "Body") as campaign:
+        campaign.pool = SenderPool(accounts)
+        result = campaign.send(db, "to@example.com", "To", files=[])
+
+    assert result["success"]
+    assert [recipients for recipients, _ in sink.received] == [["to@example.com"]]
+    usage = {row.account: row for row in db.query(SenderAccountUsage)}
+    # The failed reservation is given back and the account sits out
+    assert usage["broken"].hour_count == 0
+    assert usage["broken"].disabled_until > datetime.now()
+    assert usage["working"].hour_count == 1
+    assert campaign.pool.reserve(db).name == "working"
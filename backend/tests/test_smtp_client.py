@@ -0,0 +1,137 @@
+import smtplib
+import time
+
+import pytest
+
+from benchmarks.smtp_sink import SMTPSink
+from smtp_client import PipeliningSMTP
+
+SENDER = "sender@example.com"
+MODES = [
+    pytest.param(
+        pipelining, chunking, id=f"pipelining={pipelining}-chunking={chunking}"
+    )
+    for pipelining in (True, False)
+    for chunking in (True, False)
+]
+
+
+class Chunks:
+    """Streaming segment yielding exactly the given chunks."""
+
+    def __init__(self, *chunks: bytes):
+        self.chunks = chunks
+        self.size = sum(len(chunk) for chunk in chunks)
+
+    def iter_chunks(self, chunk_size: int):
+        return iter(self.chunks)
+
+
+class Message:
+    def __init__(self, *segments):
+        self.segments = list(segments)
+        self.size = sum(
+            len(s) if isinstance(s, bytes) else s.size for s in segments
+        )
+
+
+def connect(sink: SMTPSink) -> PipeliningSMTP:
+    server = PipeliningSMTP("127.0.0.1", sink.options.port, timeout=5)
+    server.ehlo()
+    return server
+
+
+@pytest.mark.parametrize("pipelining,chunking", MODES)
+def test_leading_periods_round_trip(start_sink, pipelining, chunking):
+    sink = start_sink(pipelining=pipelining, chunking=chunking)
+    body = b"Subject: dots\r\n\r\n.one\r\n..two\r\n.\r\nend\r\n"
+    with connect(sink) as server:
+        server.sendmail(SENDER, ["a@example.com"], body)
+    assert sink.received == [(["a@example.com"], body)]
+
+
+@pytest.mark.parametrize("pipelining,chunking", MODES)
+def test_crlf_split_across_chunks(start_sink, pipelining, chunking):
+    sink = start_sink(pipelining=pipelining, chunking=chunking)
+    message = Message(
+        b"Subject: split\r\n\r\n",
+        Chunks(b"first\r", b"\n.second\r\n", b".", b"third\r", b"\n"),
+    )
+    with connect(sink) as server:
+        server.sendmail(SENDER, ["a@example.com"], message)
+    expected = b"Subject: split\r\n\r\nfirst\r\n.second\r\n.third\r\n"
+    assert sink.received == [(["a@example.com"], expected)]
+
+
+@pytest.mark.parametrize("pipelining,chunking", MODES)
+def test_all_recipients_refused(start_sink, pipelining, chunking):
+    sink = start_sink(
+        pipelining=pipelining,
+        chunking=chunking,
+        reject_recipients=["a@example.com", "b@example.com"],
+    )
+    with connect(sink) as server:
+        with pytest.raises(smtplib.SMTPRecipientsRefused) as refused:
+            server.sendmail(SENDER, ["a@example.com", "b@example.com"], b"x\r\n")
+        assert set(refused.value.recipients) == {"a@example.com", "b@example.com"}
+        # The session is reset and stays usable
+        server.sendmail(SENDER, ["c@example.com"], b"next\r\n")
+    assert sink.received == [(["c@example.com"], b"next\r\n")]
+
+
+@pytest.mark.parametrize("pipelining", [True, False])
+def test_failing_bdat_chunk(start_sink, pipelining):
+    sink = start_sink(
+        pipelining=pipelining, bdat_chunk_reply="552 5.3.4 Message too big"
+    )
+    with connect(sink) as server:
+        server.chunk_size = 4
+        with pytest.raises(smtplib.SMTPDataError) as error:
+            server.sendmail(SENDER, ["a@example.com"], b"0123456789\r\n")
+        assert error.value.smtp_code == 552
+        assert server.sock is not None
+    assert sink.received == []
+
+
+class FailingChunks(Chunks):
+    """Segment whose source breaks after its first chunk, like a deleted spool."""
+
+    def iter_chunks(self, chunk_size: int):
+        yield self.chunks[0]
+        raise FileNotFoundError("spool removed")
+
+
+@pytest.mark.parametrize("pipelining,chunking", MODES)
+def test_failed_body_closes_session(start_sink, pipelining, chunking):
+    sink = start_sink(pipelining=pipelining, chunking=chunking)
+    server = connect(sink)
+    broken = Message(b"Subject: two\r\n\r\n", FailingChunks(b"part\r\n", b"rest"))
+    with pytest.raises(smtplib.SMTPServerDisconnected):
+        server.sendmail(SENDER, ["two@example.com"], broken)
+    assert server.sock is None
+    # Reusing the session must not append to the unfinished message
+    with pytest.raises(smtplib.SMTPServerDisconnected):
+        server.sendmail(SENDER, ["three@example.com"], b"Subject: three\r\n")
+
+    with connect(sink) as server:
+        server.sendmail(SENDER, ["three@example.com"], b"Subject: three\r\n")
+    assert sink.received == [(["three@example.com"], b"Subject: three\r\n")]
+
+
+@pytest.mark.parametrize("pipelining,chunking", MODES)
+def test_no_delayed_ack_stall(start_sink, pipelining, chunking):
+    """Small writes must not wait on Nagle plus delayed ACK (~40 ms each)."""
+    sink = start_sink(pipelining=pipelining, chunking=chunking)
+    messages = 20
+    with connect(sink) as server:
+        server.chunk_size = 1024
+        start = time.perf_counter()
+        for _ in range(messages):
+            message = Message(
+                b"Subject: latency\r\n\r\n" + b"line\r\n" * 300,
+                Chunks(b"tail\r\n", b"end\r\n"),
+            )
+            server.sendmail(SENDER, ["a@example.com"], message)
+        per_message = (time.perf_counter() - start) / messages
+    assert len(sink.received) == messages
+    assert per_message < 0.02
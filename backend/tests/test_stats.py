@@ -0,0 +1,56 @@
+from datetime import datetime, timedelta
+
+import stats
+from db import EmailHistory
+from send_service import record_history
+
+
+def add_history(db, created_at: datetime, status: str, count: int) -> None:
+    for i in range(count):
+        db.add(
+            EmailHistory(
+                recipient_name=f"R{i}",
+                recipient_email=f"r{i}@example.com",
+                subject="Old",
+                files="[]",
+                status=status,
+                message="",
+                created_at=created_at,
+            )
+        )
+    db.commit()
+
+
+def reasons(summary: dict) -> dict:
+    return {row["reason"]: row["count"] for row in summary["failure_reasons"]}
+
+
+def test_backfill_merges_sends_counted_before_it(db):
+    today = datetime.now()
+    yesterday = today - timedelta(days=1)
+    add_history(db, yesterday, "success", 3)
+    add_history(db, yesterday, "error", 1)
+    add_history(db, today, "success", 2)
+    add_history(db, today, "error", 2)
+    # Another worker counts a send before this one runs the backfill
+    record_history(
+        db, "New", "new@example.com", "New", [], False, "refused",
+        bytes_sent=0, failure_reason="recipient_refused",
+    )
+
+    assert stats.backfill(db)
+    summary = stats.summary(db)
+    assert summary["totals"]["success"] == 5
+    assert summary["totals"]["error"] == 4
+    assert reasons(summary) == {"unknown": 3, "recipient_refused": 1}
+
+    # Done once per database, however many workers start later
+    assert not stats.backfill(db)
+    assert stats.summary(db) == summary
+
+
+def test_backfill_on_empty_history(db):
+    assert stats.backfill(db)
+    record_history(db, "New", "new@example.com", "New", [], True, "sent")
+    totals = stats.summary(db)["totals"]
+    assert totals == {"total": 1, "bytes_sent": 0, "success": 1}
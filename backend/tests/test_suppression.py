@@ -0,0 +1,77 @@
+import pytest
+
+import suppression
+from db import Suppression
+
+EMAIL = "to@example.com"
+
+
+@pytest.fixture(autouse=True)
+def fresh_cache(monkeypatch):
+    monkeypatch.setattr(suppression, "_emails", set())
+    monkeypatch.setattr(suppression, "_refused", set())
+    monkeypatch.setattr(suppression, "_loaded_at", None)
+
+
+def refused(code: int, reply: str, stage: str = "rcpt") -> dict:
+    return {
+        "success": False,
+        "message": f"Recipient verification failed ({code}): {reply}",
+        "smtp_code": code,
+        "smtp_reply": reply,
+        "smtp_stage": stage,
+    }
+
+
+@pytest.mark.parametrize(
+    "code,reply",
+    [
+        (550, "5.1.1 User unknown"),
+        (553, "5.1.3 Bad recipient address syntax"),
+        (551, "5.2.1 Mailbox disabled"),
+        (550, "Requested action not taken: mailbox unavailable"),
+    ],
+)
+def test_address_failure_is_hard_bounce(db, code, reply):
+    suppression.record_result(db, EMAIL, refused(code, reply))
+    entry = db.get(Suppression, EMAIL)
+    assert entry.suppressed and entry.reason == suppression.HARD_BOUNCE
+    assert suppression.is_suppressed(db, EMAIL)
+
+
+@pytest.mark.parametrize(
+    "code,reply",
+    [
+        (550, "5.7.1 Relaying denied"),
+        (554, "5.7.1 Service unavailable; client host blocked"),
+        (550, "5.7.26 Unauthenticated email is not accepted"),
+        (552, "5.2.2 Mailbox full"),
+        (450, "4.2.0 Mailbox busy"),
+    ],
+)
+def test_other_refusals_counted(db, code, reply):
+    for attempt in range(1, suppression.REFUSAL_LIMIT + 1):
+        suppression.record_result(db, EMAIL, refused(code, reply))
+        entry = db.get(Suppression, EMAIL)
+        assert entry.refusals == attempt
+        assert entry.suppressed == (attempt == suppression.REFUSAL_LIMIT)
+    assert entry.reason == suppression.REPEATED_REFUSALS
+
+
+@pytest.mark.parametrize(
+    "result",
+    [
+        refused(421, "4.7.0 Try again later"),
+        refused(535, "5.7.8 Authentication credentials invalid"),
+        refused(550, "5.1.1 User unknown", stage=None),
+    ],
+)
+def test_session_and_non_rcpt_failures_ignored(db, result):
+    suppression.record_result(db, EMAIL, result)
+    assert db.get(Suppression, EMAIL) is None
+
+
+def test_success_clears_refusals(db):
+    suppression.record_result(db, EMAIL, refused(550, "5.7.1 Relaying denied"))
+    suppression.record_result(db, EMAIL, {"success": True, "message": "sent"})
+    assert db.get(Suppression, EMAIL) is None
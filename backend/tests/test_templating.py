@@ -0,0 +1,26 @@
+import pytest
+
+from templating import TemplateError, compile_template
+
+CONTEXT = {"name": "Kim", "email": "kim@example.com", "files": "", "file_count": "0"}
+
+
+def test_known_placeholders_render():
+    template = compile_template("Hello {{ name }} <{{email}}>")
+    assert template.render(CONTEXT) == "Hello Kim <kim@example.com>"
+
+
+def test_unknown_placeholder_is_rejected_when_strict():
+    with pytest.raises(TemplateError):
+        compile_template("Dear {{ customer }}")
+
+
+def test_unknown_placeholder_is_literal_when_not_strict():
+    template = compile_template("Dear {{ customer }}, hi {{ name }}", strict=False)
+    assert template.render(CONTEXT) == "Dear {{ customer }}, hi Kim"
+
+
+def test_non_ascii_braces_are_literal_text():
+    template = compile_template("{{ 고객명 }}님 안녕하세요")
+    assert template.is_static
+    assert template.render(CONTEXT) == "{{ 고객명 }}님 안녕하세요"
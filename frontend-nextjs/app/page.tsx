@@ -96,6 +96,26 @@ const applyFilePattern = (filename: string, pattern: string): boolean => {
   }
 };
 
+/**
+ * Idempotency keys of sends that got no response (timeout, network error),
+ * keyed by request payload. Retrying the same send reuses the key, so the
+ * backend returns the first result instead of emailing the recipient twice.
+ */
+const unansweredSendKeys = new Map<string, string>();
+
+const idempotencyKeyFor = (fingerprint: string): string => {
+  let key = unansweredSendKeys.get(fingerprint);
+  if (!key) {
+    // randomUUID is only available in secure contexts (not plain-http LAN)
+    key =
+      typeof crypto.randomUUID === "function"
+        ? crypto.randomUUID()
+        : `${Date.now().toString(36)}-${Math.random().toString(36).slice(2)}`;
+    unansweredSendKeys.set(fingerprint, key);
+  }
+  return key;
+};
+
 /**
  * Sends emails to multiple recipients
  */
@@ -138,14 +158,20 @@ const sendEmailsToRecipients = async (
       continue;
     }
 
+    const payload = {
+      receiver_email: recipient.email,
+      recipient_name: recipient.name,
+      subject: emailData.subject,
+      body: emailData.body,
+      files: matchingFiles,
+    };
+    const fingerprint = JSON.stringify(payload);
+
     try {
-      const response = await axios.post(`${BACKEND_URL}/send-email`, {
-        receiver_email: recipient.email,
-        recipient_name: recipient.name,
-        subject: emailData.subject,
-        body: emailData.body,
-        files: matchingFiles,
+      const response = await axios.post(`${BACKEND_URL}/send-email`, payload, {
+        headers: { "Idempotency-Key": idempotencyKeyFor(fingerprint) },
       });
+      unansweredSendKeys.delete(fingerprint);
 
       setStatus((prev) =>
         prev.map((s) =>
@@ -159,6 +185,11 @@ const sendEmailsToRecipients = async (
         )
       );
     } catch (error: unknown) {
+      if (axios.isAxiosError(error) && error.response && error.response.status !== 409) {
+        // The backend answered, so a retry should be a new send; 409 means
+        // the first attempt is still running and the key must be kept
+        unansweredSendKeys.delete(fingerprint);
+      }
       const errorMessage =
         axios.isAxiosError(error) && error.response?.data?.message
           ? error.response.data.message